@@ -0,0 +1,3 @@
+"""
+Ferramentas de linha de comando do servidor OAuth2 (python -m app.cli.<comando>)
+"""
@@ -0,0 +1,333 @@
+"""
+Importação em massa de usuários a partir de CSV ou JSON Lines
+
+Lê o arquivo em streaming, gera os hashes bcrypt em um pool de processos
+(um por núcleo) enquanto o processo principal grava os lotes já prontos no
+banco, com INSERT multi-linha ou COPY (PostgreSQL). A memória usada é
+constante: no máximo `workers * 2` lotes ficam em trânsito.
+
+Colunas aceitas: email, username, password ou hashed_password (bcrypt),
+full_name e is_active. Linhas inválidas ou em conflito com usuários
+existentes vão para o arquivo de rejeitados (JSON Lines, sem senhas).
+
+Uso:
+    python -m app.cli.import_users usuarios.csv
+    python -m app.cli.import_users usuarios.jsonl --batch-size 2000 --copy
+    gzip -dc usuarios.csv.gz | python -m app.cli.import_users - --format csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import Field, ValidationError, field_validator, model_validator
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from ..models import Base, User, engine
+from ..models.sharding import SHARDING_ENABLED
+from ..schemas.user import UserBase
+from ..utils.security import get_password_hash
+
+BCRYPT_HASH_RE = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+SECRET_FIELDS = ("password", "hashed_password")
+# O bcrypt (5.x) recusa senhas com mais de 72 bytes
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+
+class ImportRow(UserBase):
+    """Linha do arquivo de importação (senha em texto ou hash bcrypt pronto)"""
+    password: Optional[str] = Field(None, min_length=6, max_length=100)
+    hashed_password: Optional[str] = None
+    is_active: bool = True
+
+    @field_validator("password")
+    @classmethod
+    def check_password_bytes(cls, password: Optional[str]) -> Optional[str]:
+        if password is not None and len(password.encode("utf-8")) > BCRYPT_MAX_PASSWORD_BYTES:
+            raise ValueError(f"password cannot be longer than {BCRYPT_MAX_PASSWORD_BYTES} bytes")
+        return password
+
+    @model_validator(mode="after")
+    def check_password(self):
+        if (self.password is None) == (self.hashed_password is None):
+            raise ValueError("exactly one of password or hashed_password is required")
+        if self.hashed_password is not None and not BCRYPT_HASH_RE.match(self.hashed_password):
+            raise ValueError("hashed_password is not a bcrypt hash")
+        return self
+
+
+def read_rows(stream: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, Optional[dict]]]:
+    """Gera (número da linha, dados) sem carregar o arquivo em memória"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k}
+    else:
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            yield line_no, data if isinstance(data, dict) else None
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def hash_passwords(passwords: List[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Executado nos processos do pool
+
+    Retorna (hash, erro) por senha: uma senha que o bcrypt recusa rejeita
+    apenas a própria linha, não o lote inteiro.
+    """
+    results = []
+    for password in passwords:
+        try:
+            results.append((get_password_hash(password), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+class RejectWriter:
+    """Grava as linhas rejeitadas em JSON Lines, sem os campos de senha"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, line_no: int, reason: str, data: Optional[dict]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+        row = {k: v for k, v in (data or {}).items() if k not in SECRET_FIELDS}
+        self._file.write(json.dumps({"line": line_no, "reason": reason, "row": row}, default=str) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class UserImporter:
+    """Valida, gera hashes em paralelo e grava os usuários em lotes"""
+
+    def __init__(self, rejects: RejectWriter, batch_size: int = 1000, workers: Optional[int] = None, use_copy: bool = False):
+        self.rejects = rejects
+        self.batch_size = batch_size
+        self.workers = workers or os.process_cpu_count() or 1
+        self.use_copy = use_copy
+        self.dialect = engine.dialect.name
+        if use_copy and self.dialect != "postgresql":
+            raise ValueError("--copy requer PostgreSQL")
+
+        self.read = 0
+        self.imported = 0
+        self.started = time.perf_counter()
+
+    def validate(self, rows: Iterable[Tuple[int, Optional[dict]]]) -> Iterator[Tuple[int, ImportRow]]:
+        for line_no, data in rows:
+            self.read += 1
+            if data is None:
+                self.rejects.write(line_no, "invalid: malformed line", None)
+                continue
+            try:
+                yield line_no, ImportRow.model_validate(data)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"]) or "row"
+                self.rejects.write(line_no, f"invalid: {field}: {error['msg']}", data)
+
+    def run(self, rows: Iterable[Tuple[int, Optional[dict]]], progress_every: float = 5.0) -> None:
+        pending: deque = deque()
+        last_progress = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batched(self.validate(rows), self.batch_size):
+                pending.append((batch, self._submit_hashes(pool, batch)))
+                # Lotes em trânsito limitados: memória constante e os
+                # processos continuam ocupados enquanto o banco grava
+                while len(pending) >= self.workers * 2:
+                    self._write(*pending.popleft())
+
+                if progress_every and time.perf_counter() - last_progress >= progress_every:
+                    self.report()
+                    last_progress = time.perf_counter()
+
+            while pending:
+                self._write(*pending.popleft())
+
+    def _submit_hashes(self, pool: ProcessPoolExecutor, batch: list) -> Optional[Future]:
+        passwords = [row.password for _, row in batch if row.hashed_password is None]
+        return pool.submit(hash_passwords, passwords) if passwords else None
+
+    def _write(self, batch: list, hashes: Optional[Future]) -> None:
+        generated = iter(hashes.result()) if hashes is not None else iter(())
+        values, lines = [], {}
+        seen_usernames: Set[str] = set()
+        seen_emails: Set[str] = set()
+
+        for line_no, row in batch:
+            hashed_password, error = (row.hashed_password, None) if row.hashed_password is not None else next(generated)
+            if hashed_password is None:
+                self.rejects.write(line_no, f"invalid: password: {error}", row.model_dump())
+                continue
+            # Duplicatas dentro do lote não seriam distinguíveis no RETURNING
+            if row.username in seen_usernames or row.email in seen_emails:
+                self.rejects.write(line_no, "conflict: duplicate in input", row.model_dump())
+                continue
+            seen_usernames.add(row.username)
+            seen_emails.add(row.email)
+            lines[row.username] = (line_no, row)
+            values.append({
+                "email": row.email,
+                "username": row.username,
+                "hashed_password": hashed_password,
+                "full_name": row.full_name,
+                "is_active": row.is_active,
+                "is_superuser": False,
+            })
+
+        if not values:
+            return
+        if self.use_copy:
+            inserted = self._copy(values)
+        elif self.dialect in ("postgresql", "sqlite"):
+            inserted = self._insert_on_conflict(values)
+        else:
+            inserted = self._insert_fallback(values)
+
+        self.imported += len(inserted)
+        for username, (line_no, row) in lines.items():
+            if username not in inserted:
+                self.rejects.write(line_no, "conflict: username or email already exists", row.model_dump())
+
+    def _insert_on_conflict(self, values: List[dict]) -> Set[str]:
+        """INSERT multi-linha que ignora conflitos e retorna os usernames gravados"""
+        dialect_insert = postgresql.insert if self.dialect == "postgresql" else sqlite.insert
+        statement = dialect_insert(User).values(values).on_conflict_do_nothing().returning(User.username)
+        with engine.begin() as connection:
+            return set(connection.execute(statement).scalars())
+
+    def _insert_fallback(self, values: List[dict]) -> Set[str]:
+        """Bancos sem ON CONFLICT: tenta o lote e, em conflito, linha a linha"""
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(User), values)
+            return {value["username"] for value in values}
+        except IntegrityError:
+            pass
+
+        inserted = set()
+        with engine.connect() as connection:
+            for value in values:
+                try:
+                    with connection.begin():
+                        connection.execute(insert(User), value)
+                    inserted.add(value["username"])
+                except IntegrityError:
+                    pass
+        return inserted
+
+    def _copy(self, values: List[dict]) -> Set[str]:
+        """COPY para uma tabela temporária e INSERT ... SELECT ignorando conflitos"""
+        columns = ("email", "username", "hashed_password", "full_name", "is_active")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for value in values:
+            writer.writerow([value[column] for column in columns])
+        buffer.seek(0)
+
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TEMP TABLE IF NOT EXISTS users_import "
+                "(email varchar, username varchar, hashed_password varchar, full_name varchar, is_active boolean) "
+                "ON COMMIT DELETE ROWS"
+            )
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY users_import ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            finally:
+                cursor.close()
+            result = connection.exec_driver_sql(
+                f"INSERT INTO users ({', '.join(columns)}, is_superuser) "
+                f"SELECT {', '.join(columns)}, false FROM users_import "
+                "ON CONFLICT DO NOTHING RETURNING username"
+            )
+            return set(result.scalars())
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.read / elapsed if elapsed else 0.0
+        prefix = "Concluído" if final else "Progresso"
+        print(
+            f"{prefix}: {self.read} lidos, {self.imported} importados, "
+            f"{self.rejects.count} rejeitados em {elapsed:.1f}s ({rate:.0f} linhas/s)",
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importa usuários em massa de CSV ou JSON Lines")
+    parser.add_argument("input", help="arquivo de entrada ou '-' para stdin")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="padrão: pela extensão do arquivo")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="processos de hashing (padrão: núcleos)")
+    parser.add_argument("--copy", action="store_true", help="usa COPY (somente PostgreSQL)")
+    parser.add_argument("--rejects", help="arquivo de rejeitados (padrão: <entrada>.rejects.jsonl)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="segundos entre relatórios")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        if args.input.endswith(".csv"):
+            fmt = "csv"
+        elif args.input.endswith((".jsonl", ".ndjson")):
+            fmt = "jsonl"
+        else:
+            parser.error("não foi possível inferir o formato; use --format")
+    rejects_path = args.rejects or ("rejects.jsonl" if args.input == "-" else f"{args.input}.rejects.jsonl")
+
+    if SHARDING_ENABLED:
+        parser.error("a importação em massa não suporta SHARD_DATABASE_URLS (use /auth/register)")
+
+    Base.metadata.create_all(bind=engine)
+    rejects = RejectWriter(rejects_path)
+    try:
+        importer = UserImporter(rejects, args.batch_size, args.workers, args.copy)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        importer.run(read_rows(stream, fmt), args.progress_every)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        rejects.close()
+
+    importer.report(final=True)
+    if rejects.count:
+        print(f"Linhas rejeitadas gravadas em {rejects_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
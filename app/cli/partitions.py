@@ -0,0 +1,59 @@
+"""
+Manutenção das partições de refresh_tokens (REFRESH_TOKEN_PARTITIONING)
+
+Cria as partições dos próximos períodos e remove as totalmente expiradas.
+É idempotente; agende diariamente (cron, Kubernetes CronJob).
+
+Uso:
+    python -m app.cli.partitions
+    python -m app.cli.partitions --dry-run
+    python -m app.cli.partitions --no-drop
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+from ..config import settings
+from ..models import Base, engine
+from ..models.partitions import PARENT_TABLE, drop_expired_partitions, ensure_partitions, is_partitioned
+from ..models.sharding import SHARDING_ENABLED, create_sharded_tables, shard_engines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cria e remove partições de refresh_tokens")
+    parser.add_argument("--dry-run", action="store_true", help="apenas lista as alterações")
+    parser.add_argument("--no-drop", action="store_true", help="não remove partições expiradas")
+    args = parser.parse_args(argv)
+
+    if not settings.REFRESH_TOKEN_PARTITIONING:
+        parser.error("REFRESH_TOKEN_PARTITIONING não está habilitado")
+    # Com sharding, cada shard tem a sua tabela refresh_tokens particionada
+    targets = shard_engines or [engine]
+    if any(target.dialect.name != "postgresql" for target in targets):
+        parser.error("o particionamento de refresh_tokens requer PostgreSQL")
+
+    if SHARDING_ENABLED:
+        create_sharded_tables()
+    else:
+        Base.metadata.create_all(bind=engine)
+    prefix = "[dry-run] " if args.dry_run else ""
+    for target in targets:
+        database = target.url.render_as_string(hide_password=True)
+        with target.connect() as connection:
+            if not is_partitioned(connection):
+                print(
+                    f"{PARENT_TABLE} não é particionada ({database}): migre a tabela existente "
+                    "(README, seção Particionamento de Refresh Tokens)",
+                    file=sys.stderr,
+                )
+                return 1
+        for name in ensure_partitions(target, dry_run=args.dry_run):
+            print(f"{prefix}criada: {name} ({database})")
+        if not args.no_drop:
+            for name in drop_expired_partitions(target, dry_run=args.dry_run):
+                print(f"{prefix}removida: {name} ({database})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Requisições idempotentes com o header `Idempotency-Key`
+
+Clientes que repetem um POST após timeout enviam a mesma chave; dentro da
+janela IDEMPOTENCY_TTL_SECONDS a resposta original é devolvida sem executar
+o bcrypt nem gravar outro usuário ou refresh token. A chave vale para a
+rota e para o conteúdo exato da requisição: reutilizá-la com outro corpo
+retorna 422.
+
+As respostas ficam em memória do worker e, com IDEMPOTENCY_BACKEND=database,
+também na tabela `idempotency_keys`, compartilhada entre workers. Como elas
+contêm tokens, a janela deve ser curta.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .config import settings
+from .metrics import metrics
+from .models import IdempotencyKey
+from .models.database import SessionLocal
+from .utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Respostas que indicam que a requisição não foi processada: o cliente deve
+# poder repeti-la com a mesma chave
+NOT_STORED_STATUS = {408, 409, 425, 429}
+# Headers que dependem da requisição (Origin) e não da resposta: o
+# CORSMiddleware os recalcula a cada repetição
+NOT_STORED_HEADER_PREFIXES = ("access-control-",)
+NOT_STORED_HEADERS = {"content-length"}
+
+
+class StoredResponse:
+    """Resposta capturada para ser reenviada em repetições"""
+
+    __slots__ = ("fingerprint", "status_code", "headers", "body")
+
+    def __init__(self, fingerprint: str, status_code: int, headers: List[Tuple[str, str]], body: bytes):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def to_response(self, replayed: bool = True) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        for name, value in self.headers:
+            response.headers.append(name, value)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return response
+
+
+class InMemoryIdempotencyStore:
+    """Respostas em memória do worker, com expiração e limite de entradas"""
+
+    def __init__(self, ttl: float, max_entries: int = 10_000):
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        return self._cache.get(key)
+
+    def set(self, key: str, stored: StoredResponse) -> None:
+        self._cache.set(key, stored)
+
+
+class DatabaseIdempotencyStore:
+    """Respostas na tabela `idempotency_keys`, com cópia em memória do worker"""
+
+    def __init__(self, ttl: float, max_entries: int = 10_000, purge_every: int = 100):
+        self.ttl = ttl
+        self._local = InMemoryIdempotencyStore(ttl, max_entries)
+        self._purge_every = purge_every
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        stored = self._local.get(key)
+        if stored is not None:
+            return stored
+
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            row = db.get(IdempotencyKey, key)
+            if row is None or row.expires_at <= time.time():
+                return None
+            stored = StoredResponse(row.fingerprint, row.status_code, [tuple(h) for h in json.loads(row.headers)], row.body)
+        finally:
+            db.close()
+        return stored
+
+    def set(self, key: str, stored: StoredResponse) -> None:
+        self._local.set(key, stored)
+        now = time.time()
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            db.merge(IdempotencyKey(
+                key=key,
+                fingerprint=stored.fingerprint,
+                status_code=stored.status_code,
+                headers=json.dumps(stored.headers),
+                body=stored.body,
+                expires_at=now + self.ttl,
+            ))
+            # Remove chaves expiradas periodicamente (coberto pelo índice em expires_at)
+            self._writes += 1
+            if self._writes % self._purge_every == 0:
+                db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+def create_store(backend: str, ttl: float, max_entries: int):
+    """Instancia o armazenamento configurado em IDEMPOTENCY_BACKEND"""
+    if backend == "database":
+        return DatabaseIdempotencyStore(ttl, max_entries)
+    return InMemoryIdempotencyStore(ttl, max_entries)
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Reenvia a resposta armazenada quando um POST repete o Idempotency-Key
+
+    Repetições concorrentes da mesma chave no mesmo worker aguardam a
+    primeira requisição terminar e recebem a mesma resposta.
+    """
+
+    def __init__(self, app, store, paths: Iterable[str]):
+        super().__init__(app)
+        self.store = store
+        self.paths = set(paths)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.replays = metrics.counter("idempotency_replays_total", "Respostas reenviadas por Idempotency-Key")
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None or request.method != "POST" or request.url.path not in self.paths:
+            return await call_next(request)
+
+        if not 0 < len(idempotency_key) <= MAX_KEY_LENGTH:
+            return JSONResponse({"detail": "Invalid Idempotency-Key header"}, status_code=400)
+
+        key = hashlib.sha256(f"{request.url.path}\n{idempotency_key}".encode()).hexdigest()
+        body = await request.body()
+        # A impressão digital inclui as credenciais: só quem enviou a requisição
+        # original consegue obter a resposta armazenada. O HMAC com a SECRET_KEY
+        # impede testar credenciais candidatas contra fingerprints vazados do banco
+        fingerprint = hmac.new(
+            settings.SECRET_KEY.encode(),
+            b"\n".join([
+                request.headers.get("authorization", "").encode(),
+                request.headers.get("content-type", "").encode(),
+                body,
+            ]),
+            hashlib.sha256,
+        ).hexdigest()
+
+        while (pending := self._in_flight.get(key)) is not None:
+            await asyncio.shield(pending)
+
+        stored = await asyncio.to_thread(self.store.get, key)
+        if stored is not None:
+            return self._replay(stored, fingerprint, request)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await call_next(request)
+            if response.status_code >= 500 or response.status_code in NOT_STORED_STATUS:
+                return response
+
+            content = b"".join([chunk async for chunk in response.body_iterator])
+            headers = [
+                (name, value) for name, value in response.headers.items()
+                if name.lower() not in NOT_STORED_HEADERS
+                and not name.lower().startswith(NOT_STORED_HEADER_PREFIXES)
+            ]
+            stored = StoredResponse(fingerprint, response.status_code, headers, content)
+            try:
+                await asyncio.to_thread(self.store.set, key, stored)
+            except Exception as e:
+                logger.error(f"Erro ao armazenar resposta idempotente: {e}")
+
+            replay = stored.to_response(replayed=False)
+            replay.background = response.background
+            return replay
+        finally:
+            del self._in_flight[key]
+            future.set_result(None)
+
+    def _replay(self, stored: StoredResponse, fingerprint: str, request: Request) -> Response:
+        if stored.fingerprint != fingerprint:
+            return JSONResponse(
+                {"detail": "Idempotency-Key was already used with a different request"},
+                status_code=422,
+            )
+        self.replays.inc()
+        logger.info(f"Resposta idempotente reenviada: {request.method} {request.url.path}")
+        return stored.to_response()
@@ -1,16 +1,28 @@
 """
-Middleware customizado para rate limiting e logging de requisições
+Middleware customizado para rate limiting, controle de admissão e logging de requisições
 """
+import asyncio
+import base64
+import ipaddress
+import json
+import math
+import threading
 import time
-from typing import Callable
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
 from fastapi import Request, Response
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
-from collections import defaultdict
-from datetime import datetime, timedelta
+from collections import OrderedDict, deque
 import logging
 
+from .metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# Endpoints que nunca passam por rate limit/controle de admissão
+EXEMPT_PATHS = ["/docs", "/redoc", "/openapi.json", "/health"]
+
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     """Middleware para logging de todas as requisições"""
@@ -48,42 +60,350 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             raise
 
 
+class RateLimitPolicy:
+    """
+    Política de rate limit (token bucket) para um grupo de rotas
+    
+    - **key**: `ip` (IP real do cliente), `username` ou `client_id`; sem
+      username/client_id na requisição, usa o IP
+    - **limit** / **window**: capacidade do balde e janela de recarga (segundos)
+    - **paths**: rotas cobertas (prefixo com `*` no final); vazio cobre todas
+    - **cost** / **costs**: custo padrão e custos por rota (ex: login pesa mais que verify)
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        window: float = 60,
+        key: str = "ip",
+        paths: Optional[List[str]] = None,
+        cost: float = 1,
+        costs: Optional[Dict[str, float]] = None,
+    ):
+        if key not in ("ip", "username", "client_id"):
+            raise ValueError(f"Chave de rate limit inválida: {key}")
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.key = key
+        self.paths = paths or []
+        self.cost = cost
+        self.costs = costs or {}
+    
+    @property
+    def rate(self) -> float:
+        """Tokens recarregados por segundo"""
+        return self.limit / self.window
+    
+    def matches(self, path: str) -> bool:
+        if not self.paths:
+            return True
+        return any(
+            path.startswith(pattern[:-1]) if pattern.endswith("*") else path == pattern
+            for pattern in self.paths
+        )
+    
+    def cost_for(self, path: str) -> float:
+        return self.costs.get(path, self.cost)
+
+
+def parse_rate_limit_policies(raw: str, requests_per_minute: int = 60) -> List[RateLimitPolicy]:
+    """
+    Lê as políticas de RATE_LIMIT_POLICIES (lista JSON)
+    
+    Sem configuração, usa uma política única por IP com `requests_per_minute`.
+    """
+    if not raw.strip():
+        return [RateLimitPolicy("default", limit=requests_per_minute, window=60, key="ip")]
+    return [RateLimitPolicy(**policy) for policy in json.loads(raw)]
+
+
+def parse_trusted_proxies(raw: str) -> List[ipaddress._BaseNetwork]:
+    """Converte "10.0.0.0/8,127.0.0.1" em redes confiáveis"""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in raw.split(",") if item.strip()]
+
+
+def resolve_client_ip(request: Request, trusted_proxies: Iterable[ipaddress._BaseNetwork] = ()) -> str:
+    """
+    IP real do cliente
+    
+    Se a conexão vem de um proxy confiável, percorre o X-Forwarded-For da
+    direita para a esquerda e retorna o primeiro endereço não confiável.
+    Endereços adicionados por clientes (à esquerda) não são considerados.
+    """
+    peer = request.client.host if request.client else "unknown"
+    trusted_proxies = list(trusted_proxies)
+    
+    def is_trusted(address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in trusted_proxies)
+    
+    if not trusted_proxies or not is_trusted(peer):
+        return peer
+    
+    forwarded = request.headers.get("x-forwarded-for", "")
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+class TokenBucketStore:
+    """Baldes de tokens por chave, com limite de chaves (LRU)"""
+    
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def consume(self, key: str, capacity: float, rate: float, cost: float) -> tuple[bool, float, float]:
+        """
+        Tenta consumir `cost` tokens
+        
+        Returns:
+            (permitido, tokens restantes, segundos até o balde encher)
+        """
+        return self.consume_all([(key, capacity, rate, cost)])[0]
+    
+    def consume_all(self, requests: List[Tuple[str, float, float, float]]) -> List[tuple[bool, float, float]]:
+        """
+        Consome de vários baldes (chave, capacidade, taxa, custo) somente se
+        todos tiverem tokens suficientes
+        
+        Se algum balde recusar, nenhum é debitado: uma requisição rejeitada
+        por uma política não gasta a cota das demais.
+        
+        Returns:
+            (permitido, tokens restantes, segundos até o balde encher) por balde
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, rate, cost in requests:
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated_at) * rate))
+            allowed = all(tokens >= cost for tokens, (_, _, _, cost) in zip(levels, requests))
+            
+            results = []
+            for tokens, (key, capacity, rate, cost) in zip(levels, requests):
+                sufficient = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                results.append((sufficient, tokens, (capacity - tokens) / rate))
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return results
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     """
-    Middleware simples de rate limiting
+    Middleware de rate limiting por políticas
     
-    Limita número de requisições por IP em uma janela de tempo
+    Cada política que cobre a rota consome do balde da sua chave (IP real,
+    username ou client_id) o custo da rota; os baldes só são debitados se
+    todas as políticas permitirem a requisição. A resposta inclui os headers
+    `RateLimit-Limit`, `RateLimit-Remaining` e `RateLimit-Reset` da política
+    mais restritiva; acima do limite, retorna 429 com `Retry-After`.
     """
     
-    def __init__(self, app, requests_per_minute: int = 60):
+    def __init__(
+        self,
+        app,
+        requests_per_minute: int = 60,
+        policies: Optional[List[RateLimitPolicy]] = None,
+        trusted_proxies: Iterable[ipaddress._BaseNetwork] = (),
+    ):
         super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests = defaultdict(list)
+        self.policies = policies or parse_rate_limit_policies("", requests_per_minute)
+        self.trusted_proxies = list(trusted_proxies)
+        self.buckets = TokenBucketStore()
+    
+    async def _identity(self, request: Request, key: str) -> Optional[str]:
+        """Extrai username ou client_id do header Basic ou do corpo (JSON/form)"""
+        if key == "client_id":
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("basic "):
+                try:
+                    return base64.b64decode(authorization[6:]).decode("utf-8").split(":", 1)[0]
+                except (ValueError, UnicodeDecodeError):
+                    return None
+        
+        if request.method != "POST":
+            return None
+        content_type = request.headers.get("content-type", "")
+        body = await request.body()
+        try:
+            if content_type.startswith("application/json"):
+                value = json.loads(body).get(key)
+            elif content_type.startswith("application/x-www-form-urlencoded"):
+                value = parse_qs(body.decode("utf-8")).get(key, [None])[0]
+            else:
+                return None
+        except (ValueError, AttributeError, UnicodeDecodeError):
+            return None
+        return value if isinstance(value, str) and value else None
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # Não aplicar rate limit em endpoints de documentação
-        if request.url.path in ["/docs", "/redoc", "/openapi.json", "/health"]:
+        if request.url.path in EXEMPT_PATHS:
             return await call_next(request)
         
-        client_ip = request.client.host if request.client else "unknown"
-        now = datetime.now()
-        minute_ago = now - timedelta(minutes=1)
-        
-        # Limpar requisições antigas
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if req_time > minute_ago
-        ]
-        
-        # Verificar rate limit
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return Response(
-                content="Rate limit exceeded. Try again later.",
-                status_code=429
-            )
+        path = request.url.path
+        client_ip = resolve_client_ip(request, self.trusted_proxies)
+        # Todas as políticas são avaliadas antes de debitar qualquer balde
+        applicable = []
+        for policy in self.policies:
+            if not policy.matches(path):
+                continue
+            identity = await self._identity(request, policy.key) if policy.key != "ip" else None
+            subject = f"{policy.key}:{identity}" if identity else f"ip:{client_ip}"
+            applicable.append((policy, subject, policy.cost_for(path)))
+        
+        results = self.buckets.consume_all([
+            (f"{policy.name}|{subject}", policy.limit, policy.rate, cost)
+            for policy, subject, cost in applicable
+        ])
+        
+        tightest = None
+        for (policy, subject, cost), (allowed, remaining, reset) in zip(applicable, results):
+            if not allowed:
+                retry_after = math.ceil((cost - remaining) / policy.rate)
+                logger.warning(f"Rate limit exceeded: policy={policy.name} {subject} path={path}")
+                return JSONResponse(
+                    {"detail": "Rate limit exceeded. Try again later."},
+                    status_code=429,
+                    headers={
+                        "Retry-After": str(retry_after),
+                        "RateLimit-Limit": str(policy.limit),
+                        "RateLimit-Remaining": "0",
+                        "RateLimit-Reset": str(retry_after),
+                        "RateLimit-Policy": f"{policy.limit};w={int(policy.window)}",
+                    },
+                )
+            
+            if tightest is None or remaining < tightest[1]:
+                tightest = (policy, remaining, reset)
+        
+        response = await call_next(request)
+        
+        if tightest is not None:
+            policy, remaining, reset = tightest
+            response.headers["RateLimit-Limit"] = str(policy.limit)
+            response.headers["RateLimit-Remaining"] = str(int(remaining))
+            response.headers["RateLimit-Reset"] = str(math.ceil(reset))
+            response.headers["RateLimit-Policy"] = f"{policy.limit};w={int(policy.window)}"
+        return response
+
+
+class ConcurrencyBudget:
+    """
+    Limite de requisições simultâneas com fila de espera limitada
+
+    Quando todos os slots estão ocupados, a requisição espera na fila por até
+    `queue_timeout` segundos; se a fila estiver cheia ou o tempo esgotar, é rejeitada.
+    """
+    
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self.rejected = metrics.counter(f"admission_{name}_rejected_total", "Requisições rejeitadas (503)")
+        self.queue_wait = metrics.histogram(f"admission_{name}_queue_wait_seconds", "Espera na fila de admissão")
+    
+    async def acquire(self) -> bool:
+        """Obtém um slot; retorna False se a requisição deve ser descartada"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return True
+        
+        if len(self._waiters) >= self.max_queue:
+            self.rejected.inc()
+            return False
         
-        # Adicionar requisição atual
-        self.requests[client_ip].append(now)
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            # Cancelada (ex: cliente desconectou) depois de o slot ter sido
+            # repassado a ela: repassa ao próximo da fila para não vazá-lo
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+                self._waiters.remove(waiter)
+        
+        if waiter.cancelled():
+            self.rejected.inc()
+            return False
+        self.queue_wait.observe(time.perf_counter() - started)
+        return True
+    
+    def release(self) -> None:
+        """Libera o slot, repassando-o diretamente ao próximo da fila"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    """
+    Controle de admissão com orçamentos separados por classe de endpoint
+    
+    Endpoints caros (bcrypt: login, token, registro) têm poucos slots e fila
+    curta; os demais (ex: /auth/verify) têm orçamento próprio, então uma
+    enxurrada de logins não degrada a verificação de tokens. Requisições
+    acima do limite recebem 503 com `Retry-After` imediatamente.
+    """
+    
+    def __init__(
+        self,
+        app,
+        expensive_paths: Iterable[str] = (),
+        expensive_max_concurrent: int = 4,
+        expensive_max_queue: int = 32,
+        cheap_max_concurrent: int = 200,
+        cheap_max_queue: int = 1000,
+        queue_timeout_ms: float = 500,
+        retry_after_seconds: int = 1,
+    ):
+        super().__init__(app)
+        self.expensive_paths = set(expensive_paths)
+        queue_timeout = queue_timeout_ms / 1000
+        self.expensive = ConcurrencyBudget("expensive", expensive_max_concurrent, expensive_max_queue, queue_timeout)
+        self.cheap = ConcurrencyBudget("cheap", cheap_max_concurrent, cheap_max_queue, queue_timeout)
+        self.retry_after_seconds = retry_after_seconds
+    
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        if request.url.path in EXEMPT_PATHS:
+            return await call_next(request)
         
-        return await call_next(request)
+        budget = self.expensive if request.url.path in self.expensive_paths else self.cheap
+        if not await budget.acquire():
+            logger.warning(f"Requisição descartada (sobrecarga {budget.name}): {request.method} {request.url.path}")
+            return JSONResponse(
+                {"detail": "Server overloaded. Try again later."},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        
+        try:
+            return await call_next(request)
+        finally:
+            budget.release()
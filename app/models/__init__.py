@@ -1,5 +1,15 @@
 from .user import User
 from .refresh_token import RefreshToken
-from .database import Base, engine, get_db
+from .client import OAuthClient
+from .login_failure import LoginFailure
+from .principal import Principal
+from .idempotency_key import IdempotencyKey
+from .authorization_code import AuthorizationCode
+from .user_directory import UserDirectory
+from .database import Base, engine, get_db, get_primary_db
+from .sharding import SHARDING_ENABLED, configure_session_factory
 
-__all__ = ["User", "RefreshToken", "Base", "engine", "get_db"]
+if SHARDING_ENABLED:
+    configure_session_factory()
+
+__all__ = ["User", "RefreshToken", "OAuthClient", "LoginFailure", "Principal", "IdempotencyKey", "AuthorizationCode", "UserDirectory", "Base", "engine", "get_db", "get_primary_db"]
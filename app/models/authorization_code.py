@@ -0,0 +1,26 @@
+"""
+Modelo dos códigos de autorização (backend compartilhado do code store)
+"""
+from sqlalchemy import Column, Float, Integer, String
+from .database import Base
+
+
+class AuthorizationCode(Base):
+    """
+    Código de autorização emitido por /auth/authorize
+
+    Cada código gera exatamente um INSERT na emissão e um DELETE na troca
+    (ou na limpeza após expirar); não há colunas de estado atualizadas.
+    """
+    __tablename__ = "authorization_codes"
+
+    code_hash = Column(String, primary_key=True)  # SHA-256 do código
+    client_id = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    redirect_uri = Column(String, nullable=False)
+    code_challenge = Column(String, nullable=False)
+    scope = Column(String, nullable=True)
+    expires_at = Column(Float, nullable=False, index=True)  # Epoch em segundos
+
+    def __repr__(self):
+        return f"<AuthorizationCode(client_id={self.client_id}, user_id={self.user_id})>"
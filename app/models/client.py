@@ -0,0 +1,28 @@
+"""
+Modelo de clientes OAuth2 (autenticação serviço-a-serviço)
+"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy.sql import func
+from .database import Base
+
+
+class OAuthClient(Base):
+    """Cliente OAuth2 registrado para os grants client_credentials e authorization_code"""
+    __tablename__ = "oauth_clients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    client_id = Column(String, unique=True, index=True, nullable=False)
+    # HMAC-SHA256 do segredo (segredos são aleatórios, não precisam de bcrypt)
+    client_secret_hash = Column(String, nullable=False)
+    name = Column(String, nullable=False)
+    scopes = Column(String, nullable=True)  # Escopos permitidos, separados por espaço
+    # URIs de redirecionamento do grant authorization_code, separadas por espaço
+    redirect_uris = Column(Text, nullable=True)
+    # Cliente público (SPA, app nativo): não guarda segredo, só usa authorization_code + PKCE
+    is_public = Column(Boolean, default=False, nullable=False)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<OAuthClient(id={self.id}, client_id={self.client_id}, name={self.name})>"
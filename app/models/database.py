@@ -1,8 +1,18 @@
-from sqlalchemy import create_engine
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Select
 from ..config import settings
 
+logger = logging.getLogger(__name__)
+
 # Criar engine do banco de dados
 engine = create_engine(
     settings.DATABASE_URL,
@@ -11,8 +21,145 @@ engine = create_engine(
     max_overflow=20
 )
 
-# Criar SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Atraso da réplica em segundos; 0 se já aplicou todo o WAL recebido (sem
+# escritas recentes no primário, o último replay pode ser antigo sem atraso real)
+REPLICATION_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaPool:
+    """
+    Réplicas de leitura com round-robin e ejeção temporária
+
+    Uma réplica que falha (erro de conexão) ou cujo atraso de replicação
+    passa de `max_lag_seconds` fica fora do rodízio por `eject_seconds`; se
+    todas estiverem ejetadas, as leituras vão para o primário. O atraso é
+    medido com pg_last_xact_replay_timestamp() no máximo a cada
+    `lag_check_seconds`, ao escolher a réplica.
+    """
+
+    def __init__(
+        self,
+        engines: List[Engine],
+        eject_seconds: float = 30.0,
+        max_lag_seconds: float = 0.0,
+        lag_check_seconds: float = 5.0,
+    ):
+        self.engines = engines
+        self.eject_seconds = eject_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self._ejected_until: dict = {}
+        self._lag_checked_until: dict = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for replica in engines:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def choose(self) -> Optional[Engine]:
+        """Próxima réplica saudável ou None"""
+        if not self.engines:
+            return None
+        now = time.monotonic()
+        start = next(self._counter)
+        for offset in range(len(self.engines)):
+            replica = self.engines[(start + offset) % len(self.engines)]
+            if self._ejected_until.get(replica, 0) <= now and not self._lagging(replica, now):
+                return replica
+        return None
+
+    def eject(self, replica: Engine, reason: str = "falha") -> None:
+        with self._lock:
+            self._ejected_until[replica] = time.monotonic() + self.eject_seconds
+        logger.warning(
+            f"Réplica {replica.url.render_as_string(hide_password=True)} ejetada por "
+            f"{self.eject_seconds}s ({reason})"
+        )
+
+    def _lagging(self, replica: Engine, now: float) -> bool:
+        """Mede o atraso da réplica (se a última medição venceu) e a ejeta se estiver atrasada"""
+        if self.max_lag_seconds <= 0 or replica.dialect.name != "postgresql":
+            return False
+        with self._lock:
+            if self._lag_checked_until.get(replica, 0) > now:
+                return False
+            self._lag_checked_until[replica] = now + self.lag_check_seconds
+        try:
+            with replica.connect() as connection:
+                lag = float(connection.execute(REPLICATION_LAG_QUERY).scalar() or 0)
+        except Exception as e:
+            # Erros de conexão já ejetam a réplica pelo handle_error
+            logger.error(f"Erro ao medir o atraso da réplica: {e}")
+            return True
+        if lag > self.max_lag_seconds:
+            self.eject(replica, f"atraso de replicação de {lag:.1f}s")
+            return True
+        return False
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            self.eject(context.engine)
+
+
+replicas = ReplicaPool(
+    [
+        create_engine(url.strip(), pool_pre_ping=True, pool_size=10, max_overflow=20)
+        for url in settings.DATABASE_REPLICA_URLS.split(",")
+        if url.strip()
+    ],
+    eject_seconds=settings.REPLICA_EJECT_SECONDS,
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    lag_check_seconds=settings.REPLICA_LAG_CHECK_SECONDS,
+)
+
+
+class RoutingSession(Session):
+    """
+    Sessão que envia SELECTs para uma réplica e o restante para o primário
+
+    A decisão usa apenas o statement (SELECT sem FOR UPDATE) e a flag
+    explícita de `use_primary()`. A primeira escrita (flush, UPDATE/DELETE
+    em massa, conexão pedida sem statement) liga a flag, para que leituras
+    após escrita vejam os dados. Rotas que precisam de consistência desde o
+    início chamam `use_primary()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._use_primary = False
+        self._replica: Optional[Engine] = None
+
+    def use_primary(self) -> None:
+        self._use_primary = True
+
+    @property
+    def reads_from_replica(self) -> bool:
+        return not self._use_primary and bool(replicas.engines)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.reads_from_replica:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if not isinstance(clause, Select) or clause._for_update_arg is not None:
+            self.use_primary()
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+        # A réplica é escolhida uma vez por sessão (uma conexão por requisição)
+        if self._replica is None:
+            self._replica = replicas.choose()
+        return self._replica or super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def route_flush_to_primary(session: RoutingSession, flush_context, instances) -> None:
+    """O flush grava no primário, e as leituras seguintes da sessão também"""
+    session.use_primary()
+
+
+# Criar SessionLocal (com SHARD_DATABASE_URLS, reconfigurada por app.models.sharding)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # Base para os modelos
 Base = declarative_base()
@@ -25,3 +172,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_primary_db():
+    """Dependency para rotas de escrita: todas as consultas vão para o primário"""
+    db = SessionLocal()
+    db.use_primary()
+    try:
+        yield db
+    finally:
+        db.close()
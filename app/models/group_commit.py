@@ -0,0 +1,125 @@
+"""
+Group commit: agrega inserções concorrentes em um único INSERT/commit
+"""
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import insert
+
+from ..config import settings
+from ..metrics import metrics
+from .database import engine
+from .refresh_token import RefreshToken
+from .sharding import SHARDING_ENABLED, shard_engines, shard_for_user
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitter:
+    """
+    Coleta linhas de requisições concorrentes por alguns milissegundos e as
+    grava em lote
+
+    Cada chamada a `submit` só retorna depois que o lote contendo sua linha
+    foi confirmado (commit) no banco; se o lote falhar, todas as requisições
+    do lote recebem a exceção.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[List[dict]], None],
+        max_batch_size: int = 100,
+        max_wait_ms: float = 5.0,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.write_batch = write_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.enabled = enabled
+        self._pending: list = []
+        self._timer = None
+        self._tasks: set = set()
+
+        self.batch_size = metrics.histogram(
+            f"{name}_batch_size", "Linhas por lote gravado",
+            buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+        )
+        self.wait_time = metrics.histogram(f"{name}_wait_seconds", "Espera de cada linha até o commit do lote")
+        self.flush_time = metrics.histogram(f"{name}_flush_seconds", "Duração do INSERT/commit de cada lote")
+        self.errors = metrics.counter(f"{name}_errors_total", "Lotes que falharam")
+
+    async def submit(self, row: dict) -> None:
+        """Enfileira a linha e aguarda o commit do lote"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, batch: list) -> None:
+        started = time.perf_counter()
+        try:
+            # O driver é síncrono: grava em uma thread sem bloquear o event loop
+            await asyncio.to_thread(self.write_batch, [row for row, _, _ in batch])
+        except Exception as e:
+            self.errors.inc()
+            logger.error(f"Erro no group commit {self.name} ({len(batch)} linhas): {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        self.flush_time.observe(finished - started)
+        for _, future, enqueued_at in batch:
+            self.wait_time.observe(finished - enqueued_at)
+            if not future.done():
+                future.set_result(None)
+
+
+def insert_refresh_tokens(rows: List[dict]) -> None:
+    """
+    Grava refresh tokens em um único INSERT multi-linha e um commit
+
+    Com sharding, um INSERT por shard presente no lote.
+    """
+    if not SHARDING_ENABLED:
+        with engine.begin() as connection:
+            connection.execute(insert(RefreshToken).values(rows))
+        return
+
+    by_shard: Dict[int, List[dict]] = {}
+    for row in rows:
+        by_shard.setdefault(shard_for_user(row["user_id"]), []).append(row)
+    for shard, shard_rows in by_shard.items():
+        with shard_engines[shard].begin() as connection:
+            connection.execute(insert(RefreshToken).values(shard_rows))
+
+
+refresh_token_writer = GroupCommitter(
+    "refresh_token_group_commit",
+    insert_refresh_tokens,
+    max_batch_size=settings.GROUP_COMMIT_MAX_BATCH_SIZE,
+    max_wait_ms=settings.GROUP_COMMIT_MAX_WAIT_MS,
+    enabled=settings.REFRESH_TOKEN_GROUP_COMMIT,
+)
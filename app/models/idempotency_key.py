@@ -0,0 +1,20 @@
+"""
+Modelo das respostas armazenadas por Idempotency-Key
+"""
+from sqlalchemy import Column, Float, Integer, LargeBinary, String, Text
+from .database import Base
+
+
+class IdempotencyKey(Base):
+    """Resposta de uma requisição com Idempotency-Key (backend compartilhado)"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)  # SHA-256 de rota + Idempotency-Key
+    fingerprint = Column(String, nullable=False)  # SHA-256 da requisição original
+    status_code = Column(Integer, nullable=False)
+    headers = Column(Text, nullable=False)  # Lista JSON de pares [nome, valor]
+    body = Column(LargeBinary, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)  # Epoch em segundos
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key[:12]}, status_code={self.status_code})>"
@@ -0,0 +1,18 @@
+"""
+Modelo para o contador compartilhado de falhas de login
+"""
+from sqlalchemy import Column, String, Float
+from .database import Base
+
+
+class LoginFailure(Base):
+    """Falhas recentes de login por username (backend compartilhado do throttle)"""
+    __tablename__ = "login_failures"
+
+    username = Column(String, primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)  # Contagem com decaimento exponencial
+    last_failure_at = Column(Float, nullable=False)  # Epoch em segundos
+    locked_until = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<LoginFailure(username={self.username}, score={self.score:.2f})>"
@@ -0,0 +1,174 @@
+"""
+Partições de refresh_tokens por intervalo de expires_at (PostgreSQL)
+
+Com REFRESH_TOKEN_PARTITIONING=daily|monthly, cada partição guarda os tokens
+que expiram naquele dia/mês. A retenção deixa de depender de DELETEs linha a
+linha (e do VACUUM que eles provocam): quando todos os tokens de uma
+partição expiram, ela é removida inteira com DROP TABLE.
+
+As partições precisam existir antes dos tokens que expiram nelas serem
+emitidos. O servidor garante as partições na inicialização e a manutenção
+periódica (python -m app.cli.partitions) cria as próximas e remove as
+expiradas. Uma tabela refresh_tokens criada antes da opção não é
+particionada e precisa ser migrada (README, "Particionamento de Refresh
+Tokens"); até lá, as partições não são criadas.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ..config import settings
+from .refresh_token import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = RefreshToken.__tablename__
+PARTITION_NAME_RE = re.compile(rf"^{PARENT_TABLE}_p(\d{{6}}|\d{{8}})$")
+
+
+@dataclass(frozen=True)
+class Partition:
+    """Partição [start, end) de refresh_tokens"""
+    name: str
+    start: datetime
+    end: datetime
+
+
+def period_start(moment: datetime, granularity: str) -> datetime:
+    """Início (UTC) do dia ou mês que contém `moment`"""
+    moment = moment.astimezone(timezone.utc)
+    if granularity == "daily":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_period(start: datetime, granularity: str) -> datetime:
+    if granularity == "daily":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_for(start: datetime, granularity: str) -> Partition:
+    suffix = start.strftime("%Y%m%d" if granularity == "daily" else "%Y%m")
+    return Partition(f"{PARENT_TABLE}_p{suffix}", start, next_period(start, granularity))
+
+
+def parse_partition_name(name: str) -> Optional[Partition]:
+    """Reconstrói a partição a partir do nome (None se não foi criada por este módulo)"""
+    match = PARTITION_NAME_RE.match(name)
+    if match is None:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 8:
+        start = datetime.strptime(suffix, "%Y%m%d").replace(tzinfo=timezone.utc)
+        return partition_for(start, "daily")
+    start = datetime.strptime(suffix, "%Y%m").replace(tzinfo=timezone.utc)
+    return partition_for(start, "monthly")
+
+
+def planned_partitions(
+    now: datetime,
+    granularity: str,
+    expire_days: int,
+    ahead: int,
+) -> List[Partition]:
+    """
+    Partições necessárias a partir do período atual
+
+    Cobre a expiração máxima dos tokens emitidos agora, mais `ahead`
+    períodos de folga caso a manutenção deixe de rodar por um tempo.
+    """
+    last = period_start(now + timedelta(days=expire_days), granularity)
+    for _ in range(ahead):
+        last = next_period(last, granularity)
+
+    partitions = []
+    start = period_start(now, granularity)
+    while start <= last:
+        partition = partition_for(start, granularity)
+        partitions.append(partition)
+        start = partition.end
+    return partitions
+
+
+def existing_partitions(connection) -> List[str]:
+    """Nomes das partições atualmente ligadas a refresh_tokens"""
+    rows = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :parent"
+    ), {"parent": PARENT_TABLE})
+    return [row[0] for row in rows]
+
+
+def is_partitioned(connection) -> bool:
+    """Se refresh_tokens é uma tabela particionada (e não uma tabela comum já existente)"""
+    return bool(connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:parent))"
+    ), {"parent": PARENT_TABLE}).scalar())
+
+
+def ensure_partitions(engine: Engine, now: Optional[datetime] = None, dry_run: bool = False) -> List[str]:
+    """
+    Cria as partições que faltam; retorna os nomes criados
+
+    Se refresh_tokens não é particionada (tabela anterior à opção), registra
+    o erro e não cria nada: os tokens continuam na tabela comum.
+    """
+    granularity = settings.REFRESH_TOKEN_PARTITIONING
+    now = now or datetime.now(timezone.utc)
+    created = []
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            logger.error(
+                f"{PARENT_TABLE} não é particionada ({engine.url.render_as_string(hide_password=True)}): "
+                "REFRESH_TOKEN_PARTITIONING exige migrar a tabela existente "
+                "(README, seção Particionamento de Refresh Tokens); partições não criadas"
+            )
+            return created
+        existing = set(existing_partitions(connection))
+        for partition in planned_partitions(
+            now, granularity, settings.REFRESH_TOKEN_EXPIRE_DAYS, settings.REFRESH_TOKEN_PARTITIONS_AHEAD
+        ):
+            if partition.name in existing:
+                continue
+            if not dry_run:
+                connection.execute(text(
+                    f'CREATE TABLE IF NOT EXISTS "{partition.name}" PARTITION OF "{PARENT_TABLE}" '
+                    f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+                ))
+            created.append(partition.name)
+    for name in created:
+        logger.info(f"Partição {'planejada' if dry_run else 'criada'}: {name}")
+    return created
+
+
+def drop_expired_partitions(engine: Engine, now: Optional[datetime] = None, dry_run: bool = False) -> List[str]:
+    """
+    Remove partições cujos tokens já expiraram há mais que a retenção
+
+    Todos os tokens da partição têm expires_at < end, então nenhum token
+    utilizável é removido.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=settings.REFRESH_TOKEN_PARTITION_RETENTION_DAYS)
+    dropped = []
+    with engine.begin() as connection:
+        for name in sorted(existing_partitions(connection)):
+            partition = parse_partition_name(name)
+            if partition is None or partition.end > cutoff:
+                continue
+            if not dry_run:
+                connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+            dropped.append(name)
+    for name in dropped:
+        logger.info(f"Partição {'expirada' if dry_run else 'removida'}: {name}")
+    return dropped
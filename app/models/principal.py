@@ -0,0 +1,47 @@
+"""
+Principal: visão compacta e imutável do usuário autenticado
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .user import User
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Dados do usuário necessários às rotas autenticadas (sem o hash da senha)
+
+    Não é um objeto ORM: não pertence a nenhuma sessão e, por ser imutável,
+    pode ser compartilhado entre requisições pelo cache de usuários.
+    """
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str]
+    is_active: bool
+    is_superuser: bool
+    created_at: Optional[datetime]
+
+
+PRINCIPAL_COLUMNS = (
+    User.id,
+    User.email,
+    User.username,
+    User.full_name,
+    User.is_active,
+    User.is_superuser,
+    User.created_at,
+)
+
+
+def select_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Busca apenas as colunas do principal, sem hidratar o modelo User"""
+    row = db.execute(select(*PRINCIPAL_COLUMNS).where(User.id == user_id)).first()
+    if row is None:
+        return None
+    return Principal(*row)
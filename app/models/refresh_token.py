@@ -1,23 +1,44 @@
 """
 Modelo para armazenar refresh tokens
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from ..config import settings
 from .database import Base
 
+# Com REFRESH_TOKEN_PARTITIONING, a tabela é particionada por intervalo de
+# expires_at (PostgreSQL). Chaves primárias e únicas de tabelas particionadas
+# precisam incluir a coluna de partição.
+PARTITIONED = bool(settings.REFRESH_TOKEN_PARTITIONING)
+
+
+def _table_args():
+    args = [
+        # Listagem paginada (keyset) e revogação em massa por usuário
+        Index("ix_refresh_tokens_user_id_id", "user_id", "id"),
+    ]
+    if PARTITIONED:
+        args.append(UniqueConstraint("token", "expires_at", name="uq_refresh_tokens_token_expires_at"))
+        args.append({"postgresql_partition_by": "RANGE (expires_at)"})
+    return tuple(args)
+
 
 class RefreshToken(Base):
     """Modelo de refresh token para renovação de access tokens"""
     __tablename__ = "refresh_tokens"
+    __table_args__ = _table_args()
 
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    token = Column(String, unique=not PARTITIONED, index=not PARTITIONED, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_revoked = Column(Boolean, default=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), primary_key=PARTITIONED, nullable=False)
+    # Cliente e escopos concedidos (tokens emitidos via authorization_code)
+    client_id = Column(String, nullable=True)
+    scope = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
+
     # Relacionamento com User
     user = relationship("User", backref="refresh_tokens")
 
@@ -0,0 +1,260 @@
+"""
+Sharding horizontal de usuários e refresh tokens por user_id
+
+Com SHARD_DATABASE_URLS, as tabelas `users` e `refresh_tokens` ficam em N
+bancos (shards); as demais tabelas continuam no DATABASE_URL ("global").
+O shard de um usuário é um hash estável do id, então access tokens
+(que carregam user_id) chegam ao shard certo sem consulta extra.
+
+- Ids de usuário são alocados no diretório global (`user_directory`), que
+  também mapeia username e email para o id: logins e verificações de
+  duplicidade no registro consultam o diretório e depois um único shard.
+- Refresh tokens carregam o shard no prefixo (`s<shard>.<hex>`).
+- Consultas sem user_id, username, email ou token são executadas em todos
+  os shards, sem ordenação global; listagens ordenadas (administração) usam
+  `merge_sharded_rows`.
+
+A sessão (`ShardedUserSession`) escolhe o shard a partir dos critérios
+de cada consulta, então o código das rotas não muda. Réplicas de leitura
+(DATABASE_REPLICA_URLS) não são usadas neste modo.
+"""
+import heapq
+import logging
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from sqlalchemy import create_engine, delete, event, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.sql import operators, visitors
+
+from ..config import settings
+from ..utils.security import refresh_token_shard_hint
+from .database import Base, SessionLocal, engine
+from .refresh_token import RefreshToken
+from .user import User
+from .user_directory import UserDirectory
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SHARD = "global"
+SHARDED_TABLES = {User.__tablename__, RefreshToken.__tablename__}
+# Colunas (tabela, coluna) que identificam o shard em uma consulta
+USER_ID_COLUMNS = {("users", "id"), ("refresh_tokens", "user_id")}
+DIRECTORY_COLUMNS = {("users", "username"): UserDirectory.username, ("users", "email"): UserDirectory.email}
+
+shard_engines: List[Engine] = [
+    create_engine(url.strip(), pool_pre_ping=True, pool_size=10, max_overflow=20)
+    for url in settings.SHARD_DATABASE_URLS.split(",")
+    if url.strip()
+]
+SHARDING_ENABLED = bool(shard_engines)
+
+
+def shard_for_user(user_id: int) -> int:
+    """Shard do usuário: CRC32 do id (estável entre processos e versões)"""
+    return zlib.crc32(str(user_id).encode()) % len(shard_engines)
+
+
+def user_shard_hint(user_id: int) -> Optional[int]:
+    """Shard a embutir nos refresh tokens do usuário (None sem sharding)"""
+    return shard_for_user(user_id) if SHARDING_ENABLED else None
+
+
+def engine_for_user(user_id: int) -> Engine:
+    return shard_engines[shard_for_user(user_id)] if SHARDING_ENABLED else engine
+
+
+def all_shards() -> List[str]:
+    return [str(shard) for shard in range(len(shard_engines))]
+
+
+def merge_sharded_rows(session: Session, statement, key: Callable) -> Iterator:
+    """
+    Executa `statement` em cada shard e intercala as linhas por `key`
+
+    Cada shard devolve as suas linhas já ordenadas (ORDER BY do statement);
+    o merge lê uma linha por vez de cada resultado, então preserva a ordem
+    global também com stream_results.
+    """
+    results = [
+        session.execute(statement, bind_arguments={"shard_id": shard}).mappings()
+        for shard in all_shards()
+    ]
+    return heapq.merge(*results, key=key)
+
+
+def lookup_user_id(column, value: str) -> Optional[int]:
+    """Id global do usuário por username ou email, consultando o diretório"""
+    with engine.connect() as connection:
+        return connection.execute(select(UserDirectory.id).where(column == value)).scalar()
+
+
+def allocate_user_id(username: str, email: str) -> int:
+    """
+    Reserva username e email no diretório e retorna o novo id global
+
+    Falha com IntegrityError se o username ou o email já existirem.
+    """
+    with engine.begin() as connection:
+        return connection.execute(
+            insert(UserDirectory).values(username=username, email=email).returning(UserDirectory.id)
+        ).scalar_one()
+
+
+def release_user_ids(user_ids: Iterable[int]) -> None:
+    """Remove do diretório ids alocados para usuários que não foram gravados"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with engine.begin() as connection:
+        connection.execute(delete(UserDirectory).where(UserDirectory.id.in_(user_ids)))
+
+
+def _equality_comparisons(statement) -> list:
+    """Pares (coluna, valor) das comparações `coluna = valor` do WHERE"""
+    whereclause = getattr(statement, "whereclause", None)
+    if whereclause is None:
+        return []
+
+    binds = {}
+    columns = set()
+    comparisons = []
+
+    def visit_bindparam(bind):
+        binds[bind] = bind.effective_value
+
+    def visit_column(column):
+        columns.add(column)
+
+    def visit_binary(binary):
+        if binary.operator is not operators.eq:
+            return
+        if binary.left in columns and binary.right in binds:
+            comparisons.append((binary.left, binds[binary.right]))
+        elif binary.right in columns and binary.left in binds:
+            comparisons.append((binary.right, binds[binary.left]))
+
+    visitors.traverse(
+        whereclause, {}, {"bindparam": visit_bindparam, "column": visit_column, "binary": visit_binary}
+    )
+    return comparisons
+
+
+def _is_sharded(mapper) -> bool:
+    return mapper is not None and mapper.local_table.name in SHARDED_TABLES
+
+
+def choose_shard_for_instance(mapper, instance, clause=None) -> str:
+    """Shard onde gravar um objeto (flush) ou executar SQL sem critérios"""
+    if not _is_sharded(mapper):
+        return GLOBAL_SHARD
+    if instance is None:
+        # Conexão pedida para o mapper sem objeto associado (sem critério útil)
+        return all_shards()[0]
+    user_id = instance.id if isinstance(instance, User) else instance.user_id
+    return str(shard_for_user(user_id))
+
+
+def choose_shards_for_identity(mapper, primary_key, *, lazy_loaded_from=None, **kwargs) -> List[str]:
+    """Shards onde procurar um objeto pela chave primária (Session.get)"""
+    if lazy_loaded_from is not None:
+        return [lazy_loaded_from.identity_token]
+    if not _is_sharded(mapper):
+        return [GLOBAL_SHARD]
+    if mapper.local_table.name == User.__tablename__:
+        return [str(shard_for_user(primary_key[0]))]
+    return all_shards()
+
+
+def choose_shards_for_query(orm_context: ORMExecuteState) -> List[str]:
+    """
+    Shards de uma consulta ORM, a partir das comparações de igualdade
+
+    users.id e refresh_tokens.user_id dão o shard diretamente; o token traz
+    o shard no prefixo; username e email passam pelo diretório. Sem nenhum
+    desses critérios, a consulta vai para todos os shards.
+    """
+    if orm_context.is_select:
+        mappers = orm_context.all_mappers
+    else:
+        mappers = [orm_context.bind_mapper]
+    if not any(_is_sharded(mapper) for mapper in mappers):
+        return [GLOBAL_SHARD]
+
+    for column, value in _equality_comparisons(orm_context.statement):
+        if value is None:
+            continue
+        key = (column.table.name, column.name)
+        if key in USER_ID_COLUMNS:
+            return [str(shard_for_user(value))]
+        if key == ("refresh_tokens", "token"):
+            shard = refresh_token_shard_hint(value)
+            if shard is not None and shard < len(shard_engines):
+                return [str(shard)]
+        if key in DIRECTORY_COLUMNS:
+            user_id = lookup_user_id(DIRECTORY_COLUMNS[key], value)
+            # O diretório é autoritativo: sem entrada, qualquer shard responde "não encontrado"
+            return [str(shard_for_user(user_id if user_id is not None else 0))]
+    return all_shards()
+
+
+class ShardedUserSession(ShardedSession):
+    """Sessão que distribui `users` e `refresh_tokens` entre os shards"""
+
+    reads_from_replica = False
+
+    def __init__(self, **kwargs):
+        shards = {GLOBAL_SHARD: engine}
+        shards.update({str(shard): shard_engine for shard, shard_engine in enumerate(shard_engines)})
+        super().__init__(
+            shard_chooser=choose_shard_for_instance,
+            identity_chooser=choose_shards_for_identity,
+            execute_chooser=choose_shards_for_query,
+            shards=shards,
+            **kwargs,
+        )
+
+    def use_primary(self) -> None:
+        # Sem réplicas no modo sharded: todas as consultas já vão aos bancos principais
+        pass
+
+
+@event.listens_for(ShardedUserSession, "before_flush")
+def assign_user_ids(session: Session, flush_context, instances) -> None:
+    """Aloca no diretório o id global dos novos usuários antes do INSERT no shard"""
+    for instance in session.new:
+        if isinstance(instance, User) and instance.id is None:
+            instance.id = allocate_user_id(instance.username, instance.email)
+            session.info.setdefault("allocated_user_ids", []).append(instance.id)
+
+
+@event.listens_for(ShardedUserSession, "after_commit")
+def confirm_user_ids(session: Session) -> None:
+    session.info.pop("allocated_user_ids", None)
+
+
+@event.listens_for(ShardedUserSession, "after_rollback")
+def discard_user_ids(session: Session) -> None:
+    """Libera username/email reservados por usuários cujo INSERT falhou"""
+    user_ids = session.info.pop("allocated_user_ids", None)
+    if user_ids:
+        try:
+            release_user_ids(user_ids)
+        except Exception as e:
+            logger.error(f"Erro ao liberar ids do diretório {user_ids}: {e}")
+
+
+def configure_session_factory() -> None:
+    """Faz SessionLocal criar sessões ShardedUserSession"""
+    SessionLocal.class_ = type(ShardedUserSession.__name__, (ShardedUserSession,), {})
+    SessionLocal.configure(bind=None)
+
+
+def create_sharded_tables() -> None:
+    """Cria as tabelas globais no DATABASE_URL e users/refresh_tokens em cada shard"""
+    global_tables = [table for table in Base.metadata.sorted_tables if table.name not in SHARDED_TABLES]
+    Base.metadata.create_all(bind=engine, tables=global_tables)
+    for shard_engine in shard_engines:
+        Base.metadata.create_all(bind=shard_engine, tables=[User.__table__, RefreshToken.__table__])
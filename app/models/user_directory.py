@@ -0,0 +1,23 @@
+"""
+Diretório global de usuários (sharding)
+"""
+from sqlalchemy import Column, Integer, String
+from .database import Base
+
+
+class UserDirectory(Base):
+    """
+    Mapeia username e email para o id global do usuário
+
+    Fica no banco principal. O id é alocado aqui antes de o usuário ser
+    gravado no seu shard, e as colunas únicas garantem unicidade global de
+    username e email (cada shard só conhece os seus usuários).
+    """
+    __tablename__ = "user_directory"
+
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, unique=True, index=True, nullable=False)
+
+    def __repr__(self):
+        return f"<UserDirectory(id={self.id}, username={self.username})>"
@@ -0,0 +1,197 @@
+"""
+Profiling sob demanda de requisições
+
+Uma requisição é perfilada quando traz o header `X-Profile-Token` com o token
+configurado, ou quando é sorteada pela taxa de amostragem da sua rota.
+Os perfis são gravados em PROFILING_OUTPUT_DIR:
+
+- modo `sample` (padrão): amostragem das pilhas de todas as threads (event
+  loop e threadpool), gravada em formato "collapsed stacks" (.folded),
+  aceito por flamegraph.pl, speedscope e inferno
+- modo `cprofile`: cProfile determinístico, gravado como .prof (pstats),
+  aceito por snakeviz, flameprof e gprof2dot
+
+Como o event loop e o threadpool são compartilhados, o perfil inclui o
+trabalho de outras requisições concorrentes no mesmo worker durante a
+janela perfilada (e as threads ociosas, em espera).
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_MODE_HEADER = "X-Profile-Mode"
+PROFILE_MODES = ("sample", "cprofile")
+PROFILE_SUFFIXES = (".folded", ".prof")
+
+
+class StackSampler:
+    """
+    Amostra periodicamente as pilhas de todas as threads e agrega pilhas idênticas
+
+    Inclui o event loop e as threads do threadpool (bcrypt, consultas de
+    rotas síncronas). Cada pilha começa pelo nome da thread, então o
+    flamegraph separa o trabalho de cada uma.
+    """
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path: Path) -> None:
+        """Grava as pilhas no formato collapsed (`pilha;de;chamadas contagem`)"""
+        with open(path, "w", encoding="utf-8") as output:
+            for stack, count in self.samples.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+def parse_sample_routes(value: str) -> Dict[str, float]:
+    """
+    Converte "POST /auth/token=0.01,GET /auth/verify=0.001" em {rota: taxa}
+    """
+    routes = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        route, rate = item.rsplit("=", 1)
+        method, _, path = route.strip().partition(" ")
+        routes[f"{method.upper()} {path.strip()}"] = float(rate)
+    return routes
+
+
+def list_profiles() -> List[dict]:
+    """Índice dos perfis gravados, do mais recente para o mais antigo"""
+    output_dir = Path(settings.PROFILING_OUTPUT_DIR)
+    if not output_dir.is_dir():
+        return []
+    profiles = []
+    for path in output_dir.iterdir():
+        if path.suffix in PROFILE_SUFFIXES:
+            stat = path.stat()
+            profiles.append({"name": path.name, "size": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+
+def get_profile_path(name: str) -> Optional[Path]:
+    """Caminho de um perfil pelo nome, ou None (impede path traversal)"""
+    path = Path(settings.PROFILING_OUTPUT_DIR) / name
+    if Path(name).name != name or path.suffix not in PROFILE_SUFFIXES or not path.is_file():
+        return None
+    return path
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """Perfila requisições autorizadas ou sorteadas e grava o resultado em disco"""
+
+    def __init__(
+        self,
+        app,
+        token: str = "",
+        sample_routes: Optional[Dict[str, float]] = None,
+        output_dir: str = "profiles",
+        interval_ms: float = 1.0,
+        max_files: int = 200,
+    ):
+        super().__init__(app)
+        self.token = token
+        self.sample_routes = sample_routes or {}
+        self.output_dir = Path(output_dir)
+        self.interval = interval_ms / 1000
+        self.max_files = max_files
+        # cProfile e a amostragem de pilhas não podem ser aninhados
+        self._busy = threading.Lock()
+
+    def _requested_mode(self, request: Request) -> Optional[str]:
+        presented = request.headers.get(PROFILE_TOKEN_HEADER)
+        if presented and self.token and hmac.compare_digest(presented, self.token):
+            mode = request.headers.get(PROFILE_MODE_HEADER, "sample").lower()
+            return mode if mode in PROFILE_MODES else "sample"
+
+        rate = self.sample_routes.get(f"{request.method} {request.url.path}")
+        if rate and random.random() < rate:
+            return "sample"
+        return None
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        mode = self._requested_mode(request)
+        if mode is None or not self._busy.acquire(blocking=False):
+            return await call_next(request)
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", request.url.path).strip("_") or "root"
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}"
+
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = await call_next(request)
+                finally:
+                    profiler.disable()
+                name += ".prof"
+                profiler.dump_stats(self.output_dir / name)
+            else:
+                sampler = StackSampler(self.interval)
+                sampler.start()
+                try:
+                    response = await call_next(request)
+                finally:
+                    sampler.stop()
+                name += ".folded"
+                sampler.write(self.output_dir / name)
+
+            self._prune()
+        finally:
+            self._busy.release()
+
+        logger.info(f"Perfil gravado: {name} ({request.method} {request.url.path})")
+        response.headers["X-Profile-Id"] = name
+        return response
+
+    def _prune(self) -> None:
+        """Mantém apenas os `max_files` perfis mais recentes"""
+        for profile in list_profiles()[self.max_files:]:
+            (self.output_dir / profile["name"]).unlink(missing_ok=True)
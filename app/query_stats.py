@@ -0,0 +1,125 @@
+"""
+Contagem de comandos SQL e tempo de banco por requisição
+
+Eventos do SQLAlchemy acumulam, no contexto da requisição atual, quantos
+comandos foram executados e quanto tempo o banco levou. O middleware
+publica os totais em métricas, nos headers `X-DB-Query-Count` e
+`X-DB-Query-Time` (somente em DEBUG) e registra um aviso quando o mesmo
+comando se repete muitas vezes na requisição (suspeita de N+1).
+
+Trabalho executado no threadpool ou em tasks criadas durante a requisição
+herda o contexto e é contabilizado na requisição que o originou.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-DB-Query-Count"
+QUERY_TIME_HEADER = "X-DB-Query-Time"
+
+# Literais numéricos/strings removidos para agrupar comandos iguais com parâmetros diferentes
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryStats:
+    """Comandos SQL executados em um contexto (requisição ou bloco de teste)"""
+
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[_LITERALS_RE.sub("?", " ".join(statement.split()))] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Comandos executados pelo menos `threshold` vezes"""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+_current_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """Contabiliza os comandos SQL executados durante o bloco"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def instrument_query_counting() -> None:
+    """Registra os eventos de contagem em todas as engines"""
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        started = conn.info.get("query_started_at")
+        if stats is not None and started:
+            stats.record(statement, time.perf_counter() - started.pop())
+
+    @event.listens_for(Engine, "handle_error")
+    def _handle_error(context):
+        started = context.connection.info.get("query_started_at") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+class QueryCountMiddleware(BaseHTTPMiddleware):
+    """Publica a contagem de comandos SQL e o tempo de banco de cada requisição"""
+
+    def __init__(self, app, expose_headers: bool = False, n_plus_one_threshold: int = 5):
+        super().__init__(app)
+        self.expose_headers = expose_headers
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.queries = metrics.histogram(
+            "db_queries_per_request", "Comandos SQL por requisição",
+            buckets=(0, 1, 2, 3, 4, 5, 8, 10, 20, 50, 100),
+        )
+        self.db_time = metrics.histogram("db_time_per_request_seconds", "Tempo de banco por requisição")
+        self.n_plus_one = metrics.counter("db_n_plus_one_detected_total", "Requisições com comando SQL repetido")
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        with count_queries() as stats:
+            response = await call_next(request)
+
+        self.queries.observe(stats.count)
+        self.db_time.observe(stats.duration)
+
+        repeated = stats.repeated(self.n_plus_one_threshold) if self.n_plus_one_threshold else []
+        for statement, count in repeated:
+            self.n_plus_one.inc()
+            logger.warning(
+                f"Possível N+1 em {request.method} {request.url.path}: "
+                f"{count}x {statement[:200]}"
+            )
+
+        if self.expose_headers:
+            response.headers[QUERY_COUNT_HEADER] = str(stats.count)
+            response.headers[QUERY_TIME_HEADER] = f"{stats.duration * 1000:.2f}ms"
+        return response
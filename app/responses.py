@@ -0,0 +1,114 @@
+"""
+Respostas JSON rápidas (orjson) e serialização direta dos payloads quentes
+
+Os endpoints de token e de usuário devolvem objetos internos confiáveis
+(dicts montados pelo próprio servidor ou linhas do banco). Para esses casos
+o payload é montado diretamente e serializado com orjson, sem passar pela
+validação do `response_model` nem pelo `jsonable_encoder` do FastAPI; em
+DEBUG, o payload ainda é validado contra o schema correspondente.
+"""
+import hashlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from .config import settings
+from .schemas import Token, UserResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """Resposta JSON serializada com orjson"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def token_payload(
+    access_token: str,
+    refresh_token: Optional[str] = None,
+    scope: Optional[str] = None,
+) -> dict:
+    """Monta o payload de `Token` sem validação"""
+    payload = {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+    if scope:
+        payload["scope"] = scope
+    return payload
+
+
+def user_payload(user: Any) -> dict:
+    """Monta o payload de `UserResponse` lendo os atributos do usuário"""
+    return {
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "full_name": user.full_name,
+        "is_active": user.is_active,
+        "created_at": user.created_at,
+    }
+
+
+def _checked(schema: type[BaseModel], payload: dict) -> dict:
+    # Em desenvolvimento, garante que o payload montado à mão segue o schema
+    if settings.DEBUG:
+        schema.model_validate(payload)
+    return payload
+
+
+def token_response(
+    access_token: str,
+    refresh_token: Optional[str] = None,
+    scope: Optional[str] = None,
+    status_code: int = 200,
+) -> ORJSONResponse:
+    """Resposta de emissão de token serializada diretamente"""
+    payload = token_payload(access_token, refresh_token, scope)
+    return ORJSONResponse(_checked(Token, payload), status_code=status_code)
+
+
+def user_response(user: Any, status_code: int = 200) -> ORJSONResponse:
+    """Resposta com dados públicos do usuário serializada diretamente"""
+    payload = user_payload(user)
+    return ORJSONResponse(_checked(UserResponse, payload), status_code=status_code)
+
+
+def cache_control_for_expiry(max_age: Optional[int], shared: bool = False) -> str:
+    """
+    Valor de Cache-Control para um resultado válido por `max_age` segundos
+
+    Com `shared`, caches compartilhados (gateways, proxies) também podem
+    armazenar a resposta, mesmo com a requisição autenticada (`public`).
+    """
+    if max_age is None or max_age <= 0:
+        return "no-store"
+    if shared:
+        return f"public, max-age={max_age}, s-maxage={max_age}"
+    return f"max-age={max_age}"
+
+
+def conditional_response(request: Request, response: Response, cache_control: str) -> Response:
+    """
+    Adiciona ETag à resposta e responde 304 se o cliente já tem a versão atual
+
+    O ETag é derivado do corpo serializado, então muda sempre que os dados mudam.
+    """
+    etag = '"' + hashlib.blake2b(response.body, digest_size=16).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return response
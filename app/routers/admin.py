@@ -0,0 +1,371 @@
+from itertools import batched, islice
+from operator import itemgetter
+from typing import Annotated, Iterator, List, Optional
+import logging
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models import User, OAuthClient, Principal, get_db, get_primary_db
+from ..models.database import SessionLocal
+from ..models.sharding import SHARDING_ENABLED, merge_sharded_rows
+from ..schemas import (
+    UserAdminResponse,
+    UserPage,
+    SessionPage,
+    SessionRevokeResponse,
+    ClientCreate,
+    ClientResponse,
+    ClientSecretResponse,
+)
+from ..utils import hash_client_secret, create_client_credentials
+from ..utils.cache import invalidate_client
+from ..config import settings
+from ..metrics import metrics
+from ..profiling import list_profiles, get_profile_path
+from .auth import get_current_superuser, list_active_sessions, revoke_user_sessions
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/auth/admin", tags=["Admin"])
+
+# Colunas expostas na listagem/exportação de usuários (nunca o hash da senha)
+USER_ADMIN_COLUMNS = (
+    User.id,
+    User.email,
+    User.username,
+    User.full_name,
+    User.is_active,
+    User.is_superuser,
+    User.created_at,
+    User.updated_at,
+)
+
+
+def get_user_or_404(db: Session, user_id: int) -> User:
+    """Busca usuário por id ou retorna 404"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
+
+
+def get_client_or_404(db: Session, client_id: str) -> OAuthClient:
+    """Busca cliente OAuth2 por client_id ou retorna 404"""
+    client = db.query(OAuthClient).filter(OAuthClient.client_id == client_id).first()
+    if client is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Client not found"
+        )
+    return client
+
+
+def client_secret_response(client: OAuthClient, client_secret: str) -> dict:
+    """Monta a resposta que exibe o segredo do cliente (apenas uma vez)"""
+    return {
+        "client_id": client.client_id,
+        "client_secret": client_secret,
+        "name": client.name,
+        "scopes": client.scopes,
+        "redirect_uris": client.redirect_uris,
+        "is_public": client.is_public,
+        "is_active": client.is_active,
+        "created_at": client.created_at,
+    }
+
+
+def users_query(after_id: Optional[int], is_active: Optional[bool]):
+    """SELECT das colunas não sensíveis em ordem de id, a partir do cursor"""
+    query = select(*USER_ADMIN_COLUMNS).order_by(User.id)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    if is_active is not None:
+        query = query.where(User.is_active == is_active)
+    return query
+
+
+def user_rows(db: Session, query) -> Iterator:
+    """Linhas de `users_query` em ordem de id (intercalando os shards, com sharding)"""
+    if SHARDING_ENABLED:
+        return merge_sharded_rows(db, query, key=itemgetter("id"))
+    return iter(db.execute(query).mappings())
+
+
+def export_users_ndjson(after_id: Optional[int], is_active: Optional[bool]) -> Iterator[bytes]:
+    """
+    Gera os usuários em NDJSON lendo de um cursor do servidor
+    
+    Usa sua própria sessão, aberta durante todo o streaming, e lê
+    USERS_EXPORT_BATCH_SIZE linhas por vez: a memória não cresce com o
+    tamanho da tabela. Com sharding, há um cursor por shard, intercalados
+    por id. O Starlette itera geradores síncronos no threadpool.
+    """
+    db = SessionLocal()
+    try:
+        rows = user_rows(db, users_query(after_id, is_active).execution_options(
+            stream_results=True, yield_per=settings.USERS_EXPORT_BATCH_SIZE
+        ))
+        for batch in batched(rows, settings.USERS_EXPORT_BATCH_SIZE):
+            yield b"".join(orjson.dumps(dict(row)) + b"\n" for row in batch)
+    finally:
+        db.close()
+
+
+@router.get("/users", response_model=UserPage)
+async def list_users(
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    after_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    limit: int = Query(settings.USERS_PAGE_SIZE, ge=1, le=settings.USERS_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista usuários com paginação keyset por id (apenas administradores)
+    
+    - **after_id**: Cursor retornado em `next_after_id` pela página anterior
+    - **is_active**: Filtra por usuários ativos/inativos (opcional)
+    - **limit**: Quantidade máxima de itens por página
+    """
+    # Busca um item extra para saber se existe próxima página
+    rows = list(islice(user_rows(db, users_query(after_id, is_active).limit(limit + 1)), limit + 1))
+    next_after_id = rows[limit - 1]["id"] if len(rows) > limit else None
+    return {"items": rows[:limit], "next_after_id": next_after_id}
+
+
+@router.get("/users/export")
+async def export_users(
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    after_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+):
+    """
+    Exporta usuários em NDJSON (um objeto JSON por linha), em ordem de id
+    
+    - **after_id**: Retoma uma exportação interrompida a partir do último id recebido
+    - **is_active**: Filtra por usuários ativos/inativos (opcional)
+    """
+    logger.info(f"Exportação de usuários iniciada por {admin.username} (after_id={after_id})")
+    return StreamingResponse(
+        export_users_ndjson(after_id, is_active),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="users.ndjson"'},
+    )
+
+
+@router.get("/users/{user_id}/sessions", response_model=SessionPage)
+async def list_user_sessions(
+    user_id: int,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    after_id: Optional[int] = None,
+    limit: int = Query(settings.SESSIONS_PAGE_SIZE, ge=1, le=settings.SESSIONS_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista as sessões ativas de um usuário (apenas administradores)
+    
+    - **after_id**: Cursor retornado em `next_after_id` pela página anterior
+    - **limit**: Quantidade máxima de itens por página
+    """
+    get_user_or_404(db, user_id)
+    return list_active_sessions(db, user_id, after_id, limit)
+
+
+@router.delete("/users/{user_id}/sessions", response_model=SessionRevokeResponse)
+async def revoke_user_sessions_admin(
+    user_id: int,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Revoga todas as sessões de um usuário (resposta a incidentes)
+    
+    Executa um único UPDATE em `refresh_tokens` e invalida o cache do usuário.
+    """
+    get_user_or_404(db, user_id)
+    
+    try:
+        revoked = revoke_user_sessions(db, user_id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao revogar sessões de user_id={user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error revoking sessions"
+        )
+    
+    logger.warning(
+        f"Sessões revogadas pelo admin {admin.username}: user_id={user_id}, total={revoked}"
+    )
+    return {"user_id": user_id, "revoked": revoked}
+
+
+@router.post("/users/{user_id}/deactivate", response_model=UserAdminResponse)
+async def deactivate_user(
+    user_id: int,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Desativa o usuário e revoga todas as suas sessões
+    
+    O usuário é descartado do cache de todos os workers pelo barramento de
+    invalidação; tokens de acesso já emitidos deixam de ser aceitos.
+    """
+    user = get_user_or_404(db, user_id)
+    
+    try:
+        user.is_active = False
+        db.commit()
+        revoked = revoke_user_sessions(db, user_id)
+        db.refresh(user)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao desativar user_id={user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error deactivating user"
+        )
+    
+    logger.warning(f"Usuário {user.username} desativado por {admin.username} (sessões revogadas: {revoked})")
+    return user
+
+
+@router.post("/clients", response_model=ClientSecretResponse, status_code=status.HTTP_201_CREATED)
+async def create_client(
+    client_data: ClientCreate,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_primary_db)
+):
+    """
+    Registra um cliente OAuth2 (grants client_credentials e authorization_code)
+    
+    - **name**: Nome do serviço
+    - **scopes**: Escopos permitidos, separados por espaço (opcional)
+    - **redirect_uris**: URIs de redirecionamento do grant authorization_code,
+      separadas por espaço (opcional)
+    - **is_public**: Cliente público (SPA, app nativo), que troca códigos só
+      com PKCE e não pode usar client_credentials
+    
+    O `client_secret` é exibido apenas nesta resposta
+    """
+    client_id, client_secret = create_client_credentials()
+    
+    try:
+        client = OAuthClient(
+            client_id=client_id,
+            client_secret_hash=hash_client_secret(client_secret),
+            name=client_data.name,
+            scopes=" ".join(client_data.scopes.split()) if client_data.scopes else None,
+            redirect_uris=client_data.redirect_uris,
+            is_public=client_data.is_public,
+        )
+        db.add(client)
+        db.commit()
+        db.refresh(client)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao registrar cliente {client_data.name}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error creating client"
+        )
+    
+    logger.info(f"Cliente registrado por {admin.username}: {client.name} (client_id={client.client_id})")
+    return client_secret_response(client, client_secret)
+
+
+@router.get("/clients", response_model=List[ClientResponse])
+async def list_clients(
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_db)
+):
+    """Lista os clientes OAuth2 registrados"""
+    return db.query(OAuthClient).order_by(OAuthClient.id).all()
+
+
+@router.post("/clients/{client_id}/secret", response_model=ClientSecretResponse)
+async def rotate_client_secret(
+    client_id: str,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_primary_db)
+):
+    """Gera um novo segredo para o cliente, invalidando o anterior"""
+    client = get_client_or_404(db, client_id)
+    _, client_secret = create_client_credentials()
+    
+    try:
+        client.client_secret_hash = hash_client_secret(client_secret)
+        db.commit()
+        db.refresh(client)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao rotacionar segredo do cliente {client_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error rotating client secret"
+        )
+    
+    invalidate_client(client_id)
+    logger.warning(f"Segredo do cliente {client_id} rotacionado por {admin.username}")
+    return client_secret_response(client, client_secret)
+
+
+@router.delete("/clients/{client_id}", response_model=ClientResponse)
+async def deactivate_client(
+    client_id: str,
+    admin: Annotated[Principal, Depends(get_current_superuser)],
+    db: Session = Depends(get_primary_db)
+):
+    """Desativa o cliente; novos tokens deixam de ser emitidos para ele"""
+    client = get_client_or_404(db, client_id)
+    
+    try:
+        client.is_active = False
+        db.commit()
+        db.refresh(client)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao desativar cliente {client_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error deactivating client"
+        )
+    
+    invalidate_client(client_id)
+    logger.warning(f"Cliente {client_id} desativado por {admin.username}")
+    return client
+
+
+@router.get("/metrics")
+async def read_metrics(admin: Annotated[Principal, Depends(get_current_superuser)]):
+    """Métricas em memória deste worker (contadores e histogramas)"""
+    return metrics.snapshot()
+
+
+@router.get("/profiles")
+async def read_profiles_index(admin: Annotated[Principal, Depends(get_current_superuser)]):
+    """
+    Índice dos perfis de requisições gravados por este servidor
+    
+    Arquivos `.folded` são pilhas agregadas (flamegraph.pl, speedscope);
+    arquivos `.prof` são saídas do cProfile (snakeviz, flameprof).
+    """
+    return {"enabled": settings.PROFILING_ENABLED, "profiles": list_profiles()}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, admin: Annotated[Principal, Depends(get_current_superuser)]):
+    """Baixa um perfil gravado"""
+    path = get_profile_path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
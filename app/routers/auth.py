@@ -1,20 +1,58 @@
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Optional
+from urllib.parse import urlencode, urlsplit
+import html
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+import math
+import time
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
-from ..models import User, RefreshToken, get_db
-from ..schemas import UserCreate, UserResponse, UserLogin, Token, TokenData, RefreshTokenRequest
+from ..models import User, RefreshToken, OAuthClient, Principal, get_db, get_primary_db
+from ..models.database import SessionLocal
+from ..models.principal import select_principal
+from ..models.group_commit import refresh_token_writer
+from ..models.sharding import user_shard_hint
+from ..schemas import (
+    UserCreate,
+    UserResponse,
+    UserLogin,
+    Token,
+    TokenData,
+    RefreshTokenRequest,
+    IntrospectionResponse,
+    SessionPage,
+    SessionRevokeResponse,
+)
 from ..utils import (
     verify_password,
     get_password_hash,
+    verify_client_secret,
     create_access_token,
     decode_access_token,
     create_refresh_token,
+    refresh_token_expiry_hint,
     get_refresh_token_expire_time,
 )
+from ..utils.cache import principal_cache, client_cache, invalidate_user, cache_principal, user_generation
+from ..utils.login_throttle import login_throttle
+from ..utils.auth_codes import (
+    CODE_CHALLENGE_RE,
+    issue_authorization_code,
+    redeem_authorization_code,
+    verify_pkce,
+)
+from ..utils.single_flight import SingleFlight
+from ..responses import (
+    ORJSONResponse,
+    token_response,
+    user_response,
+    cache_control_for_expiry,
+    conditional_response,
+)
 from ..config import settings
 
 logger = logging.getLogger(__name__)
@@ -24,6 +62,45 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 # OAuth2 scheme para extrair o token do header Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# Autenticação de clientes OAuth2 via HTTP Basic (client_id:client_secret)
+client_basic_scheme = HTTPBasic(auto_error=False)
+
+# Coalescência de verificações concorrentes do mesmo token e de cargas do mesmo usuário
+token_flight = SingleFlight("token_verification")
+principal_flight = SingleFlight("principal_load")
+
+
+class OAuth2TokenRequestForm:
+    """
+    Formulário do endpoint /auth/token
+    
+    Suporta os grants `password` (padrão), `client_credentials` e
+    `authorization_code`. As credenciais do cliente podem vir no formulário ou
+    no header Authorization (Basic).
+    """
+    
+    def __init__(
+        self,
+        grant_type: Annotated[str, Form()] = "password",
+        username: Annotated[Optional[str], Form()] = None,
+        password: Annotated[Optional[str], Form()] = None,
+        scope: Annotated[str, Form()] = "",
+        client_id: Annotated[Optional[str], Form()] = None,
+        client_secret: Annotated[Optional[str], Form()] = None,
+        code: Annotated[Optional[str], Form()] = None,
+        redirect_uri: Annotated[Optional[str], Form()] = None,
+        code_verifier: Annotated[Optional[str], Form()] = None,
+    ):
+        self.grant_type = grant_type
+        self.username = username
+        self.password = password
+        self.scope = scope
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.code = code
+        self.redirect_uri = redirect_uri
+        self.code_verifier = code_verifier
+
 
 def get_user_by_username(db: Session, username: str):
     """Busca usuário por username"""
@@ -36,54 +113,351 @@ def get_user_by_email(db: Session, email: str):
 
 
 def authenticate_user(db: Session, username: str, password: str):
-    """Autentica usuário verificando username e senha"""
+    """
+    Autentica usuário verificando username e senha
+    
+    Usernames bloqueados por falhas repetidas são rejeitados com 429 antes
+    da consulta ao banco e do bcrypt.
+    """
+    retry_after = login_throttle.retry_after(username)
+    if retry_after is not None:
+        logger.warning(f"Login bloqueado pelo throttle: {username} ({retry_after:.0f}s restantes)")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts. Try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    
     user = get_user_by_username(db, username)
-    if not user:
-        return False
-    if not verify_password(password, user.hashed_password):
+    if not user and getattr(db, "reads_from_replica", False):
+        # Usuário recém-registrado pode ainda não ter replicado
+        db.use_primary()
+        user = get_user_by_username(db, username)
+    if not user or not verify_password(password, user.hashed_password):
+        login_throttle.record_failure(username)
         return False
+    login_throttle.record_success(username)
     return user
 
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
-):
-    """Dependência para obter o usuário atual a partir do token JWT"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def authenticate_client(db: Session, client_id: str, client_secret: str):
+    """
+    Autentica cliente OAuth2 verificando o HMAC do segredo
+    
+    O registro do cliente fica em cache por alguns segundos, então chamadas
+    repetidas não consultam o banco.
+    """
+    client = get_client(db, client_id)
+    if client is None or not client.is_active:
+        return False
+    if not verify_client_secret(client_secret, client.client_secret_hash):
+        return False
+    return client
+
+
+def get_client(db: Session, client_id: str) -> Optional[OAuthClient]:
+    """Busca cliente OAuth2 por client_id (com cache, desanexado da sessão)"""
+    client = client_cache.get(client_id)
+    if client is None:
+        client = db.query(OAuthClient).filter(OAuthClient.client_id == client_id).first()
+        if not client:
+            return None
+        db.expunge(client)
+        client_cache.set(client_id, client)
+    return client
+
+
+def resolve_client_scope(client: OAuthClient, requested: str) -> Optional[str]:
+    """Retorna os escopos concedidos ao cliente ou falha se pedir escopo não permitido"""
+    allowed = set((client.scopes or "").split())
+    requested_scopes = set(requested.split())
+    if not requested_scopes:
+        return client.scopes or None
+    if not requested_scopes <= allowed:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid scope"
+        )
+    return " ".join(sorted(requested_scopes))
+
+
+def introspect_access_token(db: Session, token: str) -> Optional[tuple[dict, Optional[int]]]:
+    """Introspecção de access token JWT; None se não for um JWT válido"""
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    
+    result = {
+        "active": True,
+        "token_type": "Bearer",
+        "sub": payload.get("sub"),
+        "exp": payload.get("exp"),
+        "iat": payload.get("iat"),
+        "iss": payload.get("iss"),
+        "aud": payload.get("aud"),
+    }
+    
+    user_id = payload.get("user_id")
+    if user_id is not None:
+        user = load_principal(db, user_id)
+        if user is None or not user.is_active:
+            return {"active": False}, settings.INTROSPECTION_CACHE_MAX_AGE_SECONDS
+        result["user_id"] = user.id
+        result["username"] = user.username
+    
+    for claim in ("client_id", "scope"):
+        if payload.get(claim):
+            result[claim] = payload[claim]
+    
+    remaining = int(payload["exp"] - time.time())
+    return result, max(0, min(remaining, settings.INTROSPECTION_CACHE_MAX_AGE_SECONDS))
+
+
+def introspect_refresh_token(db: Session, token: str) -> Optional[tuple[dict, Optional[int]]]:
+    """
+    Introspecção de refresh token; None se não existir ou estiver inativo
+    
+    Refresh tokens podem ser revogados a qualquer momento, então a resposta
+    não deve ser armazenada em cache (max-age None).
+    """
+    db_refresh_token = db.query(RefreshToken).filter(
+        *refresh_token_lookup(token),
+        RefreshToken.is_revoked == False,
+        RefreshToken.expires_at > datetime.now(timezone.utc),
+    ).first()
+    if db_refresh_token is None:
+        return None
+    
+    result = {
+        "active": True,
+        "token_type": "refresh_token",
+        "user_id": db_refresh_token.user_id,
+        "exp": int(db_refresh_token.expires_at.timestamp()),
+    }
+    if db_refresh_token.created_at is not None:
+        result["iat"] = int(db_refresh_token.created_at.timestamp())
+    for claim in ("client_id", "scope"):
+        if getattr(db_refresh_token, claim):
+            result[claim] = getattr(db_refresh_token, claim)
+    return result, None
+
+
+def refresh_token_lookup(token: str) -> list:
+    """
+    Filtros para localizar um refresh token
+    
+    Se o token carrega a expiração, a igualdade em expires_at permite ao
+    PostgreSQL podar as demais partições de refresh_tokens.
+    """
+    filters = [RefreshToken.token == token]
+    expires_at = refresh_token_expiry_hint(token)
+    if expires_at is not None:
+        filters.append(RefreshToken.expires_at == expires_at)
+    return filters
+
+
+async def store_refresh_token(
+    db: Session,
+    user_id: int,
+    client_id: Optional[str] = None,
+    scope: Optional[str] = None,
+) -> str:
+    """
+    Cria e persiste um novo refresh token para o usuário
+    
+    `client_id` e `scope` registram a delegação (authorization_code) para
+    que o refresh emita tokens com as mesmas restrições.
+    
+    Com REFRESH_TOKEN_GROUP_COMMIT ativo, a inserção é agregada com as de
+    outras requisições concorrentes em um único INSERT/commit.
+    """
+    expires_at = get_refresh_token_expire_time()
+    refresh_token_str = create_refresh_token(expires_at, user_shard_hint(user_id))
+    
+    if refresh_token_writer.enabled:
+        await refresh_token_writer.submit({
+            "token": refresh_token_str,
+            "user_id": user_id,
+            "expires_at": expires_at,
+            "is_revoked": False,
+            "client_id": client_id,
+            "scope": scope,
+        })
+    else:
+        db.add(RefreshToken(
+            token=refresh_token_str,
+            user_id=user_id,
+            expires_at=expires_at,
+            client_id=client_id,
+            scope=scope,
+        ))
+        db.commit()
+    
+    return refresh_token_str
+
+
+def list_active_sessions(db: Session, user_id: int, after_id: Optional[int], limit: int):
+    """
+    Lista sessões ativas do usuário com paginação keyset por id
+
+    Usa o índice (user_id, id), evitando OFFSET em usuários com muitos tokens.
+    """
+    query = db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.is_revoked == False,
+        RefreshToken.expires_at > datetime.now(timezone.utc),
     )
+    if after_id is not None:
+        query = query.filter(RefreshToken.id > after_id)
+    
+    # Busca um item extra para saber se existe próxima página
+    rows = query.order_by(RefreshToken.id).limit(limit + 1).all()
+    next_after_id = rows[limit - 1].id if len(rows) > limit else None
+    return {"items": rows[:limit], "next_after_id": next_after_id}
+
+
+def revoke_user_sessions(db: Session, user_id: int) -> int:
+    """
+    Revoga todos os refresh tokens do usuário em um único UPDATE
+
+    Retorna a quantidade de tokens revogados.
+    """
+    revoked = db.query(RefreshToken).filter(
+        RefreshToken.user_id == user_id,
+        RefreshToken.is_revoked == False,
+    ).update({RefreshToken.is_revoked: True}, synchronize_session=False)
+    db.commit()
+    invalidate_user(user_id)
+    return revoked
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    """Busca o principal do usuário usando o cache de usuários autenticados"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
     
+    generation = user_generation(user_id)
+    if generation is not None:
+        db.use_primary()
+    principal = select_principal(db, user_id)
+    if principal is None:
+        return None
+    
+    cache_principal(user_id, principal, generation)
+    return principal
+
+
+def fetch_principal(user_id: int) -> Optional[Principal]:
+    """Carrega e guarda em cache o principal, em sessão própria (executado no threadpool)"""
+    generation = user_generation(user_id)
+    db = SessionLocal()
+    try:
+        if generation is not None:
+            db.use_primary()
+        principal = select_principal(db, user_id)
+    finally:
+        db.close()
+    if principal is not None:
+        cache_principal(user_id, principal, generation)
+    return principal
+
+
+async def load_principal_shared(user_id: int) -> Optional[Principal]:
+    """
+    Versão assíncrona de `load_principal`: cargas concorrentes do mesmo
+    user_id compartilham uma única consulta
+    """
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    return await principal_flight.do(user_id, lambda: run_in_threadpool(fetch_principal, user_id))
+
+
+async def resolve_access_token(token: str) -> Optional[tuple[dict, Principal]]:
+    """Valida o access token e carrega o principal; None se inválido"""
     payload = decode_access_token(token)
     if payload is None:
-        raise credentials_exception
+        return None
     
     username: str = payload.get("sub")
     user_id: int = payload.get("user_id")
     
     if username is None or user_id is None:
-        raise credentials_exception
+        return None
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await load_principal_shared(user_id)
     if user is None:
-        raise credentials_exception
+        return None
+    return payload, user
+
+
+async def get_current_user(
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+) -> Principal:
+    """
+    Dependência para obter o principal do usuário atual a partir do token JWT
     
+    Verificações concorrentes do mesmo token (ex: um gateway distribuindo
+    chamadas a /auth/verify) compartilham a decodificação e a consulta.
+    """
+    resolved = await token_flight.do(token, lambda: resolve_access_token(token))
+    if resolved is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    payload, user = resolved
+    
+    # Claims disponíveis para cabeçalhos de cache das respostas
+    request.state.token_payload = payload
     return user
 
 
 async def get_current_active_user(
-    current_user: Annotated[User, Depends(get_current_user)]
-):
+    current_user: Annotated[Principal, Depends(get_current_user)]
+) -> Principal:
     """Verifica se o usuário está ativo"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
+async def get_current_first_party_user(
+    request: Request,
+    current_user: Annotated[Principal, Depends(get_current_active_user)]
+) -> Principal:
+    """
+    Rejeita tokens delegados a clientes OAuth2 (claim `client_id`)
+    
+    Um token obtido por um cliente via authorization_code vale para os
+    escopos concedidos, não para gerenciar as sessões do usuário nem para
+    a administração.
+    """
+    if request.state.token_payload.get("client_id"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token issued to a client cannot be used here"
+        )
+    return current_user
+
+
+async def get_current_superuser(
+    current_user: Annotated[Principal, Depends(get_current_first_party_user)]
+) -> Principal:
+    """Verifica se o usuário atual é administrador"""
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough privileges"
+        )
+    return current_user
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_primary_db)):
     """
     Endpoint para registro de novo usuário
     
@@ -114,7 +488,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     
     try:
         # Criar novo usuário
-        hashed_password = get_password_hash(user_data.password)
+        # bcrypt fora do event loop: requisições baratas seguem sendo atendidas
+        hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
         db_user = User(
             email=user_data.email,
             username=user_data.username,
@@ -127,7 +502,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         db.refresh(db_user)
         
         logger.info(f"Usuário registrado com sucesso: {user_data.username} (ID: {db_user.id})")
-        return db_user
+        return user_response(db_user, status_code=status.HTTP_201_CREATED)
         
     except Exception as e:
         db.rollback()
@@ -138,22 +513,384 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
 
 
+class AuthorizationError(Exception):
+    """Erro de autorização devolvido ao cliente no redirect_uri (RFC 6749, seção 4.1.2.1)"""
+    
+    def __init__(self, error: str, description: str):
+        super().__init__(description)
+        self.error = error
+        self.description = description
+
+
+AUTHORIZE_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h1>{title}</h1>
+<p><strong>{client_name}</strong> solicita acesso à sua conta{scope}.</p>
+{error}<form method="post" action="/auth/authorize">
+{hidden}<label>Usuário <input name="username" autocomplete="username" required></label>
+<label>Senha <input name="password" type="password" autocomplete="current-password" required></label>
+<button type="submit">Autorizar</button>
+</form>
+</body>
+</html>
+"""
+
+
+def authorize_page(
+    client: OAuthClient,
+    params: dict,
+    error: Optional[str] = None,
+    status_code: int = status.HTTP_200_OK,
+) -> HTMLResponse:
+    """Formulário de login da autorização, com os parâmetros em campos ocultos"""
+    hidden = "".join(
+        f'<input type="hidden" name="{name}" value="{html.escape(value)}">\n'
+        for name, value in params.items()
+        if value is not None
+    )
+    content = AUTHORIZE_PAGE.format(
+        title=html.escape(settings.APP_NAME),
+        client_name=html.escape(client.name),
+        scope=f" ({html.escape(params['scope'])})" if params.get("scope") else "",
+        error=f"<p>{html.escape(error)}</p>\n" if error else "",
+        hidden=hidden,
+    )
+    return HTMLResponse(
+        content,
+        status_code=status_code,
+        headers={"Cache-Control": "no-store", "X-Frame-Options": "DENY"},
+    )
+
+
+def authorization_params(
+    client: OAuthClient,
+    redirect_uri: str,
+    response_type: str,
+    code_challenge: str,
+    code_challenge_method: str,
+    scope: str,
+    state: Optional[str],
+) -> dict:
+    """Parâmetros da autorização reenviados pelo formulário de login"""
+    return {
+        "client_id": client.client_id,
+        "redirect_uri": redirect_uri,
+        "response_type": response_type,
+        "code_challenge": code_challenge,
+        "code_challenge_method": code_challenge_method,
+        "scope": scope or None,
+        "state": state,
+    }
+
+
+def authorization_redirect(redirect_uri: str, params: dict) -> RedirectResponse:
+    """Redireciona de volta ao cliente com os parâmetros na query string"""
+    query = urlencode({name: value for name, value in params.items() if value is not None})
+    separator = "&" if urlsplit(redirect_uri).query else "?"
+    return RedirectResponse(f"{redirect_uri}{separator}{query}", status_code=status.HTTP_303_SEE_OTHER)
+
+
+def resolve_authorization_client(
+    db: Session,
+    client_id: Optional[str],
+    redirect_uri: Optional[str],
+) -> tuple[OAuthClient, str]:
+    """
+    Valida client_id e redirect_uri (comparação exata com os registrados)
+    
+    Erros aqui não podem ser redirecionados ao cliente, então falham com 400.
+    Sem redirect_uri, vale a única URI registrada.
+    """
+    client = get_client(db, client_id) if client_id else None
+    if client is None or not client.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid client"
+        )
+    
+    registered = (client.redirect_uris or "").split()
+    if redirect_uri is None and len(registered) == 1:
+        redirect_uri = registered[0]
+    if redirect_uri not in registered:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid redirect_uri"
+        )
+    return client, redirect_uri
+
+
+def validate_authorization_request(
+    client: OAuthClient,
+    response_type: Optional[str],
+    code_challenge: Optional[str],
+    code_challenge_method: Optional[str],
+    scope: str,
+) -> Optional[str]:
+    """Valida os demais parâmetros e retorna os escopos concedidos"""
+    if response_type != "code":
+        raise AuthorizationError("unsupported_response_type", "Only response_type=code is supported")
+    
+    # PKCE obrigatório, somente S256 (o método plain expõe o verificador)
+    if code_challenge_method != "S256" or not code_challenge or not CODE_CHALLENGE_RE.match(code_challenge):
+        raise AuthorizationError("invalid_request", "PKCE with code_challenge_method=S256 is required")
+    
+    try:
+        return resolve_client_scope(client, scope)
+    except HTTPException:
+        raise AuthorizationError("invalid_scope", "Invalid scope")
+
+
+@router.get("/authorize", response_class=HTMLResponse)
+async def authorize_form(
+    client_id: Optional[str] = None,
+    redirect_uri: Optional[str] = None,
+    response_type: Optional[str] = None,
+    code_challenge: Optional[str] = None,
+    code_challenge_method: Optional[str] = None,
+    scope: str = "",
+    state: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Início do grant authorization_code (RFC 6749, seção 4.1, com PKCE)
+    
+    - **client_id**: Cliente registrado
+    - **redirect_uri**: Uma das URIs registradas para o cliente
+    - **response_type**: `code`
+    - **code_challenge** / **code_challenge_method**: PKCE, apenas `S256`
+    - **scope**: Escopos solicitados, separados por espaço (opcional)
+    - **state**: Valor opaco devolvido ao cliente no redirecionamento
+    
+    Retorna o formulário de login
+    """
+    client, redirect_uri = resolve_authorization_client(db, client_id, redirect_uri)
+    try:
+        validate_authorization_request(client, response_type, code_challenge, code_challenge_method, scope)
+    except AuthorizationError as e:
+        return authorization_redirect(redirect_uri, {"error": e.error, "error_description": e.description, "state": state})
+    
+    return authorize_page(
+        client,
+        authorization_params(client, redirect_uri, response_type, code_challenge, code_challenge_method, scope, state),
+    )
+
+
+@router.post("/authorize", response_class=HTMLResponse)
+async def authorize(
+    username: Annotated[str, Form()],
+    password: Annotated[str, Form()],
+    client_id: Annotated[Optional[str], Form()] = None,
+    redirect_uri: Annotated[Optional[str], Form()] = None,
+    response_type: Annotated[Optional[str], Form()] = None,
+    code_challenge: Annotated[Optional[str], Form()] = None,
+    code_challenge_method: Annotated[Optional[str], Form()] = None,
+    scope: Annotated[str, Form()] = "",
+    state: Annotated[Optional[str], Form()] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Autentica o usuário e redireciona ao cliente com o código de autorização
+    
+    O código vale AUTH_CODE_TTL_SECONDS, é de uso único e fica vinculado ao
+    cliente, ao redirect_uri e ao code_challenge.
+    """
+    client, redirect_uri = resolve_authorization_client(db, client_id, redirect_uri)
+    try:
+        granted_scope = validate_authorization_request(client, response_type, code_challenge, code_challenge_method, scope)
+    except AuthorizationError as e:
+        return authorization_redirect(redirect_uri, {"error": e.error, "error_description": e.description, "state": state})
+    
+    user = await run_in_threadpool(authenticate_user, db, username, password)
+    if not user:
+        logger.warning(f"Autorização falhou: credenciais inválidas para {username} (client_id={client.client_id})")
+        return authorize_page(
+            client,
+            authorization_params(client, redirect_uri, response_type, code_challenge, code_challenge_method, scope, state),
+            error="Usuário ou senha incorretos",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+    
+    if not user.is_active:
+        return authorization_redirect(redirect_uri, {"error": "access_denied", "error_description": "Inactive user", "state": state})
+    
+    try:
+        code = await run_in_threadpool(
+            issue_authorization_code, client.client_id, user.id, redirect_uri, code_challenge, granted_scope
+        )
+    except Exception as e:
+        logger.error(f"Erro ao emitir código de autorização para {user.username}: {e}")
+        return authorization_redirect(redirect_uri, {
+            "error": "temporarily_unavailable",
+            "error_description": "Error issuing authorization code",
+            "state": state,
+        })
+    
+    logger.info(f"Código de autorização emitido: {user.username} (client_id={client.client_id})")
+    return authorization_redirect(redirect_uri, {"code": code, "state": state})
+
+
+def require_client(
+    db: Session,
+    basic: Optional[HTTPBasicCredentials],
+    client_id: Optional[str],
+    client_secret: Optional[str],
+):
+    """Autentica o cliente via HTTP Basic ou campos do formulário, ou falha com 401"""
+    if basic is not None:
+        client_id, client_secret = basic.username, basic.password
+    
+    if not client_id or not client_secret:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Client authentication required",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    
+    client = authenticate_client(db, client_id, client_secret)
+    if not client:
+        logger.warning(f"Autenticação de cliente falhou: client_id={client_id}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid client credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return client
+
+
+def client_credentials_grant(
+    db: Session,
+    form_data: OAuth2TokenRequestForm,
+    basic: Optional[HTTPBasicCredentials],
+):
+    """Emite access token para um cliente OAuth2 (sem refresh token)"""
+    client = require_client(db, basic, form_data.client_id, form_data.client_secret)
+    if client.is_public:
+        # O segredo de um cliente público não é confidencial: não autentica o serviço
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unauthorized client"
+        )
+    scope = resolve_client_scope(client, form_data.scope)
+    access_token = create_access_token(
+        data={"sub": client.client_id, "client_id": client.client_id, "scope": scope},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    
+    logger.debug(f"Token emitido para cliente: {client.client_id}")
+    return token_response(access_token, scope=scope)
+
+
+async def authorization_code_grant(
+    db: Session,
+    form_data: OAuth2TokenRequestForm,
+    basic: Optional[HTTPBasicCredentials],
+):
+    """
+    Troca um código de autorização (com PKCE) por access e refresh tokens
+    
+    Clientes confidenciais precisam se autenticar com o segredo. Clientes
+    públicos (`is_public`) se identificam apenas pelo client_id; o
+    code_verifier prova que a troca vem de quem iniciou a autorização.
+    """
+    if not form_data.code or not form_data.redirect_uri or not form_data.code_verifier:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="code, redirect_uri and code_verifier are required"
+        )
+    
+    client_id = basic.username if basic is not None else form_data.client_id
+    if not client_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Client authentication required",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    client = get_client(db, client_id)
+    if client is not None and client.is_public and basic is None and not form_data.client_secret:
+        if not client.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid client credentials",
+                headers={"WWW-Authenticate": "Basic"},
+            )
+    else:
+        # Cliente confidencial (ou segredo enviado): o segredo é obrigatório e precisa ser válido
+        client_id = require_client(db, basic, form_data.client_id, form_data.client_secret).client_id
+    
+    # O código é consumido antes das verificações: uma tentativa inválida o invalida
+    issued = await run_in_threadpool(redeem_authorization_code, form_data.code)
+    if (
+        issued is None
+        or issued.client_id != client_id
+        or issued.redirect_uri != form_data.redirect_uri
+        or not verify_pkce(form_data.code_verifier, issued.code_challenge)
+    ):
+        logger.warning(f"Troca de código de autorização falhou: client_id={client_id}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid authorization code"
+        )
+    
+    user = await load_principal_shared(issued.user_id)
+    if user is None or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid authorization code"
+        )
+    
+    access_token = create_access_token(
+        data={"sub": user.username, "user_id": user.id, "client_id": client_id, "scope": issued.scope},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token_str = await store_refresh_token(db, user.id, client_id, issued.scope)
+    
+    logger.info(f"Código de autorização trocado: {user.username} (client_id={client_id})")
+    return token_response(access_token, refresh_token_str, scope=issued.scope)
+
+
 @router.post("/token", response_model=Token)
 async def login(
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    form_data: Annotated[OAuth2TokenRequestForm, Depends()],
+    basic: Annotated[Optional[HTTPBasicCredentials], Depends(client_basic_scheme)] = None,
     db: Session = Depends(get_db)
 ):
     """
     Endpoint OAuth2 compatível para login (token)
     
-    - **username**: Nome de usuário
-    - **password**: Senha
+    - **grant_type**: `password` (padrão), `client_credentials` ou `authorization_code`
+    - **username**: Nome de usuário (grant password)
+    - **password**: Senha (grant password)
+    - **client_id** / **client_secret**: Credenciais do cliente (grant
+      client_credentials; também aceitas via HTTP Basic)
+    - **scope**: Escopos solicitados, separados por espaço (opcional)
+    - **code** / **redirect_uri** / **code_verifier**: Código emitido por
+      /auth/authorize e o verificador PKCE (grant authorization_code)
     
     Retorna um access_token JWT
     """
+    if form_data.grant_type == "client_credentials":
+        return client_credentials_grant(db, form_data, basic)
+    
+    if form_data.grant_type == "authorization_code":
+        return await authorization_code_grant(db, form_data, basic)
+    
+    if form_data.grant_type != "password":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported grant type"
+        )
+    
+    if not form_data.username or not form_data.password:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username and password are required"
+        )
+    
     logger.info(f"Tentativa de login: {form_data.username}")
     
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await run_in_threadpool(authenticate_user, db, form_data.username, form_data.password)
     if not user:
         logger.warning(f"Login falhou: credenciais inválidas para {form_data.username}")
         raise HTTPException(
@@ -162,35 +899,25 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Lidos antes do commit: depois dele, o acesso aos atributos recarregaria o usuário
+    user_id, username = user.id, user.username
     try:
         # Criar access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.username, "user_id": user.id},
+            data={"sub": username, "user_id": user_id},
             expires_delta=access_token_expires
         )
         
         # Criar e salvar refresh token
-        refresh_token_str = create_refresh_token()
-        refresh_token = RefreshToken(
-            token=refresh_token_str,
-            user_id=user.id,
-            expires_at=get_refresh_token_expire_time()
-        )
-        db.add(refresh_token)
-        db.commit()
+        refresh_token_str = await store_refresh_token(db, user_id)
         
-        logger.info(f"Login bem-sucedido: {user.username} (ID: {user.id})")
+        logger.info(f"Login bem-sucedido: {username} (ID: {user_id})")
         
-        return {
-            "access_token": access_token,
-            "refresh_token": refresh_token_str,
-            "token_type": "bearer",
-            "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-        }
+        return token_response(access_token, refresh_token_str)
     except Exception as e:
         db.rollback()
-        logger.error(f"Erro ao gerar token para {user.username}: {e}")
+        logger.error(f"Erro ao gerar token para {username}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error generating token"
@@ -209,7 +936,7 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
     """
     logger.info(f"Tentativa de login (JSON): {user_data.username}")
     
-    user = authenticate_user(db, user_data.username, user_data.password)
+    user = await run_in_threadpool(authenticate_user, db, user_data.username, user_data.password)
     if not user:
         logger.warning(f"Login falhou (JSON): credenciais inválidas para {user_data.username}")
         raise HTTPException(
@@ -217,35 +944,25 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="Incorrect username or password",
         )
     
+    # Lidos antes do commit: depois dele, o acesso aos atributos recarregaria o usuário
+    user_id, username = user.id, user.username
     try:
         # Criar access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.username, "user_id": user.id},
+            data={"sub": username, "user_id": user_id},
             expires_delta=access_token_expires
         )
         
         # Criar e salvar refresh token
-        refresh_token_str = create_refresh_token()
-        refresh_token = RefreshToken(
-            token=refresh_token_str,
-            user_id=user.id,
-            expires_at=get_refresh_token_expire_time()
-        )
-        db.add(refresh_token)
-        db.commit()
+        refresh_token_str = await store_refresh_token(db, user_id)
         
-        logger.info(f"Login bem-sucedido (JSON): {user.username} (ID: {user.id})")
+        logger.info(f"Login bem-sucedido (JSON): {username} (ID: {user_id})")
         
-        return {
-            "access_token": access_token,
-            "refresh_token": refresh_token_str,
-            "token_type": "bearer",
-            "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-        }
+        return token_response(access_token, refresh_token_str)
     except Exception as e:
         db.rollback()
-        logger.error(f"Erro ao gerar token (JSON) para {user.username}: {e}")
+        logger.error(f"Erro ao gerar token (JSON) para {username}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error generating token"
@@ -254,33 +971,124 @@ async def login_json(user_data: UserLogin, db: Session = Depends(get_db)):
 
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    request: Request,
+    current_user: Annotated[Principal, Depends(get_current_active_user)]
 ):
     """
     Endpoint para obter informações do usuário atual autenticado
     
-    Requer token JWT válido no header Authorization
+    Requer token JWT válido no header Authorization. Suporta `If-None-Match`:
+    se os dados não mudaram, retorna 304 sem corpo.
     """
-    return current_user
+    return conditional_response(request, user_response(current_user), "private, no-cache")
 
 
 @router.get("/verify")
-async def verify_token(current_user: Annotated[User, Depends(get_current_active_user)]):
+async def verify_token(
+    request: Request,
+    current_user: Annotated[Principal, Depends(get_current_active_user)]
+):
     """
     Endpoint para verificar se o token é válido
     
-    Usado por outros backends para validar tokens
+    Usado por outros backends para validar tokens. A resposta pode ser
+    reaproveitada até o limite de `Cache-Control: max-age`/`s-maxage`,
+    inclusive por um gateway compartilhado: `Vary: Authorization` separa
+    as entradas por token.
     """
-    return {
+    remaining = int(request.state.token_payload["exp"] - time.time())
+    max_age = max(0, min(remaining, settings.INTROSPECTION_CACHE_MAX_AGE_SECONDS))
+    return ORJSONResponse({
         "valid": True,
         "user_id": current_user.id,
         "username": current_user.username,
         "email": current_user.email,
-    }
+    }, headers={
+        "Cache-Control": cache_control_for_expiry(max_age, shared=True),
+        "Vary": "Authorization",
+    })
+
+
+@router.post("/introspect", response_model=IntrospectionResponse)
+async def introspect_token(
+    token: Annotated[str, Form()],
+    token_type_hint: Annotated[Optional[str], Form()] = None,
+    client_id: Annotated[Optional[str], Form()] = None,
+    client_secret: Annotated[Optional[str], Form()] = None,
+    basic: Annotated[Optional[HTTPBasicCredentials], Depends(client_basic_scheme)] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Introspecção de tokens (RFC 7662)
+    
+    - **token**: Access token ou refresh token a ser inspecionado
+    - **token_type_hint**: `access_token` ou `refresh_token` (opcional)
+    
+    Requer autenticação de cliente OAuth2 (HTTP Basic ou client_id/client_secret).
+    A resposta inclui `Cache-Control: max-age` limitado ao tempo restante do
+    token. Caches HTTP não armazenam POST pela chave do corpo: o max-age é
+    uma indicação para o chamador, que deve guardar o resultado indexado
+    pelo `token` enviado (nunca pelo cabeçalho Authorization, que
+    identifica o cliente e não o token inspecionado).
+    """
+    require_client(db, basic, client_id, client_secret)
+    
+    lookups = [introspect_access_token, introspect_refresh_token]
+    if token_type_hint == "refresh_token":
+        lookups.reverse()
+    
+    result, max_age = {"active": False}, settings.INTROSPECTION_CACHE_MAX_AGE_SECONDS
+    for lookup in lookups:
+        found = lookup(db, token)
+        if found is not None:
+            result, max_age = found
+            break
+    
+    return ORJSONResponse(result, headers={"Cache-Control": cache_control_for_expiry(max_age)})
+
+
+@router.get("/sessions", response_model=SessionPage)
+async def list_my_sessions(
+    current_user: Annotated[Principal, Depends(get_current_first_party_user)],
+    after_id: Optional[int] = None,
+    limit: int = Query(settings.SESSIONS_PAGE_SIZE, ge=1, le=settings.SESSIONS_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    """
+    Lista as sessões ativas (refresh tokens) do usuário atual
+    
+    - **after_id**: Cursor retornado em `next_after_id` pela página anterior
+    - **limit**: Quantidade máxima de itens por página
+    """
+    return list_active_sessions(db, current_user.id, after_id, limit)
+
+
+@router.delete("/sessions", response_model=SessionRevokeResponse)
+async def logout_everywhere(
+    current_user: Annotated[Principal, Depends(get_current_first_party_user)],
+    db: Session = Depends(get_db)
+):
+    """
+    Revoga todas as sessões do usuário atual ("sair de todos os dispositivos")
+    
+    Access tokens já emitidos continuam válidos até expirarem.
+    """
+    try:
+        revoked = revoke_user_sessions(db, current_user.id)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao revogar sessões de user_id={current_user.id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error revoking sessions"
+        )
+    
+    logger.info(f"Sessões revogadas: user={current_user.username} (ID: {current_user.id}), total={revoked}")
+    return {"user_id": current_user.id, "revoked": revoked}
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get_db)):
+async def refresh_access_token(request: RefreshTokenRequest, db: Session = Depends(get_primary_db)):
     """
     Endpoint para renovar access token usando refresh token
     
@@ -292,7 +1100,7 @@ async def refresh_access_token(request: RefreshTokenRequest, db: Session = Depen
     
     # Buscar refresh token no banco
     db_refresh_token = db.query(RefreshToken).filter(
-        RefreshToken.token == request.refresh_token,
+        *refresh_token_lookup(request.refresh_token),
         RefreshToken.is_revoked == False
     ).first()
     
@@ -303,8 +1111,11 @@ async def refresh_access_token(request: RefreshTokenRequest, db: Session = Depen
             detail="Invalid refresh token"
         )
     
-    # Verificar se o token expirou
-    if db_refresh_token.expires_at < datetime.now(timezone.utc):
+    # Verificar se o token expirou (SQLite devolve datetimes sem fuso, gravados em UTC)
+    expires_at = db_refresh_token.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at < datetime.now(timezone.utc):
         logger.warning(f"Refresh token expirado para user_id={db_refresh_token.user_id}")
         db_refresh_token.is_revoked = True
         db.commit()
@@ -322,38 +1133,52 @@ async def refresh_access_token(request: RefreshTokenRequest, db: Session = Depen
             detail="User not found or inactive"
         )
     
+    # Tokens delegados deixam de ser renováveis se o cliente for desativado
+    client_id, scope = db_refresh_token.client_id, db_refresh_token.scope
+    if client_id is not None:
+        client = get_client(db, client_id)
+        if client is None or not client.is_active:
+            logger.warning(f"Refresh de cliente inativo ou removido: client_id={client_id}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token"
+            )
+    
+    # Lidos antes do commit: depois dele, o acesso aos atributos recarregaria o usuário
+    user_id, username = user.id, user.username
     try:
         # Revogar o refresh token antigo
         db_refresh_token.is_revoked = True
         
-        # Criar novo access token
+        # Criar novo access token (com o cliente e os escopos da delegação, se houver)
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        token_data = {"sub": username, "user_id": user_id}
+        if client_id is not None:
+            token_data.update(client_id=client_id, scope=scope)
         access_token = create_access_token(
-            data={"sub": user.username, "user_id": user.id},
+            data=token_data,
             expires_delta=access_token_expires
         )
         
         # Criar novo refresh token
-        new_refresh_token_str = create_refresh_token()
+        new_expires_at = get_refresh_token_expire_time()
+        new_refresh_token_str = create_refresh_token(new_expires_at, user_shard_hint(user_id))
         new_refresh_token = RefreshToken(
             token=new_refresh_token_str,
-            user_id=user.id,
-            expires_at=get_refresh_token_expire_time()
+            user_id=user_id,
+            expires_at=new_expires_at,
+            client_id=client_id,
+            scope=scope,
         )
         db.add(new_refresh_token)
         db.commit()
         
-        logger.info(f"Token renovado com sucesso para user={user.username} (ID: {user.id})")
+        logger.info(f"Token renovado com sucesso para user={username} (ID: {user_id})")
         
-        return {
-            "access_token": access_token,
-            "refresh_token": new_refresh_token_str,
-            "token_type": "bearer",
-            "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
-        }
+        return token_response(access_token, new_refresh_token_str, scope=scope)
     except Exception as e:
         db.rollback()
-        logger.error(f"Erro ao renovar token para user_id={user.id}: {e}")
+        logger.error(f"Erro ao renovar token para user_id={user_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error refreshing token"
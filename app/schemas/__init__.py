@@ -1,14 +1,25 @@
-from .user import UserBase, UserCreate, UserLogin, UserResponse, UserInDB
-from .token import Token, TokenData
+from .user import UserBase, UserCreate, UserLogin, UserResponse, UserAdminResponse, UserPage, UserInDB
+from .token import Token, TokenData, IntrospectionResponse
 from .refresh import RefreshTokenRequest
+from .session import SessionResponse, SessionPage, SessionRevokeResponse
+from .client import ClientCreate, ClientResponse, ClientSecretResponse
 
 __all__ = [
     "UserBase",
     "UserCreate",
     "UserLogin",
     "UserResponse",
+    "UserAdminResponse",
+    "UserPage",
     "UserInDB",
     "Token",
     "TokenData",
+    "IntrospectionResponse",
     "RefreshTokenRequest",
+    "SessionResponse",
+    "SessionPage",
+    "SessionRevokeResponse",
+    "ClientCreate",
+    "ClientResponse",
+    "ClientSecretResponse",
 ]
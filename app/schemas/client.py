@@ -0,0 +1,48 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional
+from datetime import datetime
+from urllib.parse import urlsplit
+
+
+class ClientCreate(BaseModel):
+    """Schema para registro de cliente OAuth2"""
+    name: str = Field(..., min_length=1, max_length=100)
+    scopes: Optional[str] = Field(None, max_length=1000, description="Escopos separados por espaço")
+    redirect_uris: Optional[str] = Field(
+        None, max_length=2000, description="URIs de redirecionamento separadas por espaço"
+    )
+    is_public: bool = Field(
+        False, description="Cliente público (sem segredo confiável): apenas authorization_code com PKCE"
+    )
+
+    @field_validator("redirect_uris")
+    @classmethod
+    def validate_redirect_uris(cls, value: Optional[str]) -> Optional[str]:
+        """URIs absolutas http(s), sem fragmento (RFC 6749, seção 3.1.2)"""
+        if value is None:
+            return None
+        uris = value.split()
+        for uri in uris:
+            parts = urlsplit(uri)
+            if parts.scheme not in ("http", "https") or not parts.netloc or parts.fragment:
+                raise ValueError(f"Invalid redirect URI: {uri}")
+        return " ".join(uris) or None
+
+
+class ClientResponse(BaseModel):
+    """Schema de resposta com informações do cliente (sem o segredo)"""
+    client_id: str
+    name: str
+    scopes: Optional[str] = None
+    redirect_uris: Optional[str] = None
+    is_public: bool = False
+    is_active: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ClientSecretResponse(ClientResponse):
+    """Resposta de criação/rotação: o segredo só é exibido uma vez"""
+    client_secret: str
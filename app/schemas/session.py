@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+
+class SessionResponse(BaseModel):
+    """Sessão ativa (refresh token) sem expor o valor do token"""
+    id: int
+    user_id: int
+    client_id: Optional[str] = None  # Cliente OAuth2 que obteve a sessão (authorization_code)
+    created_at: Optional[datetime] = None
+    expires_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SessionPage(BaseModel):
+    """Página de sessões com cursor para a próxima página (keyset)"""
+    items: List[SessionResponse]
+    next_after_id: Optional[int] = None
+
+
+class SessionRevokeResponse(BaseModel):
+    """Resultado da revogação em massa de sessões"""
+    user_id: int
+    revoked: int
@@ -5,12 +5,28 @@ from typing import Optional
 class Token(BaseModel):
     """Schema de resposta com token de acesso e refresh token"""
     access_token: str
-    refresh_token: str
+    refresh_token: Optional[str] = None  # Ausente no grant client_credentials
     token_type: str = "bearer"
     expires_in: int
+    scope: Optional[str] = None
 
 
 class TokenData(BaseModel):
     """Dados extraídos do token JWT"""
     username: Optional[str] = None
     user_id: Optional[int] = None
+
+
+class IntrospectionResponse(BaseModel):
+    """Resposta de introspecção de token (RFC 7662)"""
+    active: bool
+    token_type: Optional[str] = None
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+    iss: Optional[str] = None
+    aud: Optional[str] = None
+    scope: Optional[str] = None
+    client_id: Optional[str] = None
+    username: Optional[str] = None
+    user_id: Optional[int] = None
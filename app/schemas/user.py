@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -31,6 +31,18 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserAdminResponse(UserResponse):
+    """Usuário na listagem administrativa (sem o hash da senha)"""
+    is_superuser: bool
+    updated_at: Optional[datetime] = None
+
+
+class UserPage(BaseModel):
+    """Página de usuários com cursor para a próxima página (keyset)"""
+    items: List[UserAdminResponse]
+    next_after_id: Optional[int] = None
+
+
 class UserInDB(UserBase):
     """Schema do usuário no banco de dados"""
     id: int
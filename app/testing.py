@@ -0,0 +1,99 @@
+"""
+Utilitários de teste: orçamento de comandos SQL por endpoint
+
+test_query_budgets.py exercita cada rota de QUERY_BUDGETS. Uso avulso,
+com a aplicação em DEBUG:
+
+    client = TestClient(main.app)
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert_response_query_budget(response, "GET /auth/me")
+
+    with SessionLocal() as db, assert_max_queries(1):
+        load_principal(db, user_id)
+
+Com pytest, a fixture `query_budget` (QueryBudget) é registrada pelo
+conftest.py da raiz (fora dele, use `pytest -p app.testing`).
+
+A verificação por resposta lê o header X-DB-Query-Count, publicado pelo
+QueryCountMiddleware quando DEBUG=True.
+"""
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .query_stats import QUERY_COUNT_HEADER, QueryStats, count_queries
+
+# Máximo de comandos SQL por endpoint no caminho feliz, com cache de usuários vazio.
+# Ao otimizar um endpoint, reduza o orçamento; aumentá-lo exige justificativa.
+QUERY_BUDGETS = {
+    "POST /auth/register": 4,  # email, username, INSERT, releitura do usuário
+    "POST /auth/login": 2,  # usuário, novo refresh token
+    "POST /auth/token": 2,  # usuário, novo refresh token
+    "GET /auth/authorize": 1,  # cliente
+    "POST /auth/authorize": 2,  # cliente, usuário (código em memória)
+    "POST /auth/refresh": 4,  # token, usuário, revogação, novo token (sem cliente OAuth2)
+    "GET /auth/me": 1,
+    "GET /auth/verify": 1,
+    "POST /auth/introspect": 2,  # cliente, usuário
+    "GET /auth/sessions": 2,  # usuário, página de sessões
+    "DELETE /auth/sessions": 2,  # usuário, UPDATE
+}
+
+
+def format_statements(stats: QueryStats) -> str:
+    return "\n".join(f"  {count}x {statement}" for statement, count in stats.statements.most_common())
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[QueryStats]:
+    """Falha se o bloco executar mais que `max_queries` comandos SQL"""
+    with count_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise AssertionError(
+            f"{stats.count} comandos SQL executados (orçamento: {max_queries}):\n{format_statements(stats)}"
+        )
+
+
+def response_query_count(response) -> int:
+    """Quantidade de comandos SQL informada pelo header da resposta"""
+    value = response.headers.get(QUERY_COUNT_HEADER)
+    if value is None:
+        raise AssertionError(
+            f"Resposta sem o header {QUERY_COUNT_HEADER}: habilite DEBUG e QUERY_STATS_ENABLED"
+        )
+    return int(value)
+
+
+def assert_response_query_budget(response, route: str, max_queries: Optional[int] = None) -> int:
+    """Falha se a requisição executou mais comandos que o orçamento da rota"""
+    budget = QUERY_BUDGETS[route] if max_queries is None else max_queries
+    count = response_query_count(response)
+    if count > budget:
+        raise AssertionError(f"{route}: {count} comandos SQL executados (orçamento: {budget})")
+    return count
+
+
+class QueryBudget:
+    """Objeto entregue pela fixture `query_budget`"""
+
+    budgets = QUERY_BUDGETS
+
+    @staticmethod
+    def check(response, route: str, max_queries: Optional[int] = None) -> int:
+        return assert_response_query_budget(response, route, max_queries)
+
+    @staticmethod
+    def limit(max_queries: int):
+        return assert_max_queries(max_queries)
+
+
+try:
+    import pytest
+except ImportError:  # pytest não é dependência de produção
+    pytest = None
+
+if pytest is not None:
+    @pytest.fixture
+    def query_budget() -> QueryBudget:
+        """Fixture com os orçamentos de comandos SQL por endpoint"""
+        return QueryBudget()
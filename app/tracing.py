@@ -0,0 +1,275 @@
+"""
+Tracing leve em processo (modelo de dados compatível com OpenTelemetry)
+
+Cada requisição gera um span SERVER, continuando o trace recebido no header
+W3C `traceparent` quando presente. Spans filhos cobrem bcrypt, JWT e as
+consultas SQL. Ao final da requisição, os spans do trace são entregues ao
+exporter configurado (memória para testes locais ou arquivo JSON Lines).
+"""
+import abc
+import contextvars
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    """Span no formato do modelo de dados do OpenTelemetry"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_span_id", "kind",
+        "start_time_unix_nano", "end_time_unix_nano", "attributes",
+        "status", "status_description",
+    )
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, kind: str = "INTERNAL"):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self.attributes: dict = {}
+        self.status = "UNSET"
+        self.status_description: Optional[str] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.status = "ERROR"
+        self.status_description = str(exception)
+        self.attributes["exception.type"] = type(exception).__name__
+
+    def end(self) -> None:
+        if self.end_time_unix_nano is None:
+            self.end_time_unix_nano = time.time_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time_unix_nano is None:
+            return None
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_time_unix_nano,
+            "endTimeUnixNano": self.end_time_unix_nano,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_description},
+        }
+
+
+class SpanExporter(abc.ABC):
+    """Interface de exporters: recebe os spans finalizados de um trace"""
+
+    @abc.abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        ...
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Mantém os últimos spans em memória (para testes e inspeção local)"""
+
+    def __init__(self, max_spans: int = 10000):
+        self._spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileSpanExporter(SpanExporter):
+    """Acrescenta os spans em um arquivo JSON Lines (um span por linha)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as output:
+            output.write(lines)
+
+
+# Span ativo e spans finalizados do trace da requisição atual
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_finished_spans: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("finished_spans", default=None)
+
+
+class Tracer:
+    """Cria spans filhos do span ativo e os entrega ao exporter"""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, enabled: bool = True):
+        self.exporter = exporter
+        self.enabled = enabled and exporter is not None
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def begin(self, name: str, kind: str = "INTERNAL", parent: Optional[Span] = None) -> Span:
+        """Cria um span sem ativá-lo no contexto (para callbacks como eventos SQL)"""
+        parent = parent or _current_span.get()
+        if parent is None:
+            return Span(name, secrets.token_hex(16), kind=kind)
+        return Span(name, parent.trace_id, parent.span_id, kind=kind)
+
+    def finish(self, span: Span) -> None:
+        span.end()
+        finished = _finished_spans.get()
+        if finished is not None:
+            finished.append(span)
+        else:
+            self.export_trace([span])
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "INTERNAL", **attributes) -> Iterator[Optional[Span]]:
+        """Context manager que ativa um span filho durante o bloco"""
+        if not self.enabled:
+            yield None
+            return
+        span = self.begin(name, kind)
+        span.attributes.update(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def export_trace(self, spans: List[Span]) -> None:
+        """Entrega spans finalizados ao exporter; falhas são registradas, nunca propagadas"""
+        if not self.enabled:
+            return
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.error(f"Erro ao exportar spans: {e}")
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """Extrai (trace_id, parent_span_id) de um header W3C traceparent"""
+    if not value:
+        return None
+    match = TRACEPARENT_RE.match(value.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2)
+
+
+def format_traceparent(span: Span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def create_exporter(kind: str) -> SpanExporter:
+    """Instancia o exporter configurado em TRACING_EXPORTER"""
+    if kind == "memory":
+        return InMemorySpanExporter(settings.TRACING_MAX_SPANS)
+    if kind == "file":
+        return FileSpanExporter(settings.TRACING_FILE)
+    raise ValueError(f'TRACING_EXPORTER inválido: "{kind}" (use "memory" ou "file")')
+
+
+# O exporter só é validado e criado com o tracing habilitado
+tracer = Tracer(
+    create_exporter(settings.TRACING_EXPORTER) if settings.TRACING_ENABLED else None,
+    enabled=settings.TRACING_ENABLED,
+)
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """Cria o span SERVER da requisição e propaga o traceparent na resposta"""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        parent = parse_traceparent(request.headers.get("traceparent"))
+        if parent is not None:
+            span = Span(f"{request.method} {request.url.path}", parent[0], parent[1], kind="SERVER")
+        else:
+            span = tracer.begin(f"{request.method} {request.url.path}", kind="SERVER")
+        span.set_attribute("http.request.method", request.method)
+        span.set_attribute("url.path", request.url.path)
+
+        finished: list = []
+        span_token = _current_span.set(span)
+        finished_token = _finished_spans.set(finished)
+        try:
+            response = await call_next(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            if response.status_code >= 500:
+                span.status = "ERROR"
+            response.headers["traceparent"] = format_traceparent(span)
+            return response
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(span_token)
+            _finished_spans.reset(finished_token)
+            span.end()
+            finished.append(span)
+            tracer.export_trace(finished)
+
+
+def instrument_sqlalchemy() -> None:
+    """Registra spans para cada comando SQL executado por qualquer engine"""
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is None:
+            return
+        span = tracer.begin(f"db {statement.split(None, 1)[0].upper() if statement else 'SQL'}", kind="CLIENT")
+        span.set_attribute("db.system", conn.dialect.name)
+        span.set_attribute("db.statement", statement[:1000])
+        conn.info.setdefault("tracing_spans", []).append(span)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("tracing_spans")
+        if spans:
+            tracer.finish(spans.pop())
+
+    @event.listens_for(Engine, "handle_error")
+    def _handle_error(context):
+        spans = context.connection.info.get("tracing_spans") if context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(context.original_exception)
+            tracer.finish(span)
@@ -1,17 +1,27 @@
 from .security import (
     verify_password,
     get_password_hash,
+    hash_client_secret,
+    verify_client_secret,
+    create_client_credentials,
     create_access_token,
     decode_access_token,
     create_refresh_token,
+    refresh_token_expiry_hint,
+    refresh_token_shard_hint,
     get_refresh_token_expire_time,
 )
 
 __all__ = [
     "verify_password",
     "get_password_hash",
+    "hash_client_secret",
+    "verify_client_secret",
+    "create_client_credentials",
     "create_access_token",
     "decode_access_token",
     "create_refresh_token",
+    "refresh_token_expiry_hint",
+    "refresh_token_shard_hint",
     "get_refresh_token_expire_time",
 ]
@@ -0,0 +1,182 @@
+"""
+Armazenamento de códigos de autorização (authorization_code + PKCE)
+
+Códigos vivem AUTH_CODE_TTL_SECONDS (60s por padrão) e são usados uma única
+vez. O backend padrão guarda os códigos em memória, com um heap de
+expirações para descartar os vencidos sem varrer o mapa. Com
+AUTH_CODE_BACKEND=database, os códigos também ficam na tabela
+`authorization_codes`, para que a troca funcione em qualquer worker.
+"""
+import base64
+import hashlib
+import heapq
+import hmac
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete
+
+from ..config import settings
+from ..models import AuthorizationCode
+from ..models.database import SessionLocal
+
+# RFC 7636: 43 a 128 caracteres "unreserved"
+CODE_VERIFIER_RE = re.compile(r"^[A-Za-z0-9\-._~]{43,128}$")
+CODE_CHALLENGE_RE = re.compile(r"^[A-Za-z0-9\-_]{43}$")
+
+
+@dataclass(frozen=True, slots=True)
+class IssuedCode:
+    """Dados vinculados a um código de autorização"""
+    client_id: str
+    user_id: int
+    redirect_uri: str
+    code_challenge: str
+    scope: Optional[str]
+    expires_at: float
+
+
+def hash_code(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def pkce_challenge(code_verifier: str) -> str:
+    """code_challenge S256: BASE64URL(SHA256(code_verifier)) sem padding"""
+    digest = hashlib.sha256(code_verifier.encode("ascii")).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def verify_pkce(code_verifier: str, code_challenge: str) -> bool:
+    if not CODE_VERIFIER_RE.match(code_verifier):
+        return False
+    return hmac.compare_digest(pkce_challenge(code_verifier), code_challenge)
+
+
+class InMemoryCodeStore:
+    """Mapa de códigos com índice de expiração (heap), limitado em tamanho"""
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._codes: dict = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def put(self, code_hash: str, issued: IssuedCode) -> None:
+        with self._lock:
+            self._purge(time.time())
+            if len(self._codes) >= self.max_entries:
+                raise OverflowError("Authorization code store is full")
+            self._codes[code_hash] = issued
+            heapq.heappush(self._expiry, (issued.expires_at, code_hash))
+
+    def take(self, code_hash: str) -> Optional[IssuedCode]:
+        """Remove e retorna o código (uso único); None se ausente ou expirado"""
+        with self._lock:
+            issued = self._codes.pop(code_hash, None)
+        if issued is None or issued.expires_at <= time.time():
+            return None
+        return issued
+
+    def _purge(self, now: float) -> None:
+        # O heap pode conter códigos já trocados; pop em ordem de expiração
+        while self._expiry and self._expiry[0][0] <= now:
+            _, code_hash = heapq.heappop(self._expiry)
+            issued = self._codes.get(code_hash)
+            if issued is not None and issued.expires_at <= now:
+                del self._codes[code_hash]
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+
+class DatabaseCodeStore:
+    """
+    Códigos na tabela `authorization_codes`
+
+    A troca é um único `DELETE ... RETURNING`: atômica entre workers, então
+    o mesmo código não pode ser trocado duas vezes.
+    """
+
+    def __init__(self, purge_every: int = 100):
+        self._purge_every = purge_every
+        self._writes = 0
+
+    def put(self, code_hash: str, issued: IssuedCode) -> None:
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            db.add(AuthorizationCode(
+                code_hash=code_hash,
+                client_id=issued.client_id,
+                user_id=issued.user_id,
+                redirect_uri=issued.redirect_uri,
+                code_challenge=issued.code_challenge,
+                scope=issued.scope,
+                expires_at=issued.expires_at,
+            ))
+            self._writes += 1
+            if self._writes % self._purge_every == 0:
+                db.execute(delete(AuthorizationCode).where(AuthorizationCode.expires_at <= time.time()))
+            db.commit()
+        finally:
+            db.close()
+
+    def take(self, code_hash: str) -> Optional[IssuedCode]:
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            row = db.execute(
+                delete(AuthorizationCode)
+                .where(AuthorizationCode.code_hash == code_hash, AuthorizationCode.expires_at > time.time())
+                .returning(
+                    AuthorizationCode.client_id,
+                    AuthorizationCode.user_id,
+                    AuthorizationCode.redirect_uri,
+                    AuthorizationCode.code_challenge,
+                    AuthorizationCode.scope,
+                    AuthorizationCode.expires_at,
+                )
+            ).first()
+            db.commit()
+        finally:
+            db.close()
+        return IssuedCode(*row) if row is not None else None
+
+
+def create_code_store(backend: str):
+    """Instancia o armazenamento configurado em AUTH_CODE_BACKEND"""
+    if backend == "database":
+        return DatabaseCodeStore()
+    return InMemoryCodeStore(settings.AUTH_CODE_MAX_ENTRIES)
+
+
+authorization_codes = create_code_store(settings.AUTH_CODE_BACKEND)
+
+
+def issue_authorization_code(
+    client_id: str,
+    user_id: int,
+    redirect_uri: str,
+    code_challenge: str,
+    scope: Optional[str],
+) -> str:
+    """Gera um código de autorização e o registra no store"""
+    code = secrets.token_urlsafe(32)
+    authorization_codes.put(hash_code(code), IssuedCode(
+        client_id=client_id,
+        user_id=user_id,
+        redirect_uri=redirect_uri,
+        code_challenge=code_challenge,
+        scope=scope,
+        expires_at=time.time() + settings.AUTH_CODE_TTL_SECONDS,
+    ))
+    return code
+
+
+def redeem_authorization_code(code: str) -> Optional[IssuedCode]:
+    """Consome o código; None se inválido, expirado ou já utilizado"""
+    return authorization_codes.take(hash_code(code))
@@ -0,0 +1,145 @@
+"""
+Cache em memória com expiração (TTL) para dados quentes de autenticação
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from ..config import settings
+from .invalidation import invalidation_bus
+
+
+class TTLCache:
+    """
+    Cache LRU limitado com expiração por entrada
+
+    Seguro para uso concorrente entre threads do worker. Entradas expiradas
+    são descartadas na leitura; quando o cache atinge `maxsize`, a entrada
+    menos recentemente usada é removida.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Retorna o valor em cache ou `default` se ausente/expirado"""
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Armazena um valor, opcionalmente com TTL próprio"""
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove uma entrada; retorna True se ela existia"""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Usuários autenticados, indexados por user_id
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+# Access tokens que falharam na validação, indexados pelo SHA-256 do token
+invalid_token_cache = TTLCache(
+    maxsize=settings.INVALID_TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.INVALID_TOKEN_CACHE_TTL_SECONDS,
+)
+
+# Clientes OAuth2 verificados, indexados por client_id
+client_cache = TTLCache(
+    maxsize=settings.CLIENT_CACHE_MAX_SIZE,
+    ttl=settings.CLIENT_CACHE_TTL_SECONDS,
+)
+
+
+# Usuários invalidados recentemente, com a geração da última invalidação: a
+# releitura vai ao banco principal, pois uma réplica atrasada devolveria o
+# estado anterior à invalidação (ex: usuário ainda ativo), que voltaria ao
+# cache por mais um TTL
+recently_invalidated_users = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+_invalidation_generations = itertools.count(1)
+# Serializa a invalidação com a gravação de principals lidos do banco
+_principal_lock = threading.Lock()
+
+
+def user_generation(user_id: int) -> Optional[int]:
+    """Geração da última invalidação recente do usuário (None se não houve); ler antes da consulta"""
+    return recently_invalidated_users.get(user_id)
+
+
+def cache_principal(user_id: int, principal: Any, generation: Optional[int]) -> None:
+    """
+    Guarda o principal lido do banco, salvo se o usuário foi invalidado
+    durante a leitura (o principal lido pode ser anterior à invalidação)
+    """
+    with _principal_lock:
+        if recently_invalidated_users.get(user_id) == generation:
+            principal_cache.set(user_id, principal)
+
+
+def evict(kind: str, key: Hashable) -> None:
+    """Descarta a entrada local indicada por um evento de invalidação"""
+    if kind == "user":
+        with _principal_lock:
+            recently_invalidated_users.set(key, next(_invalidation_generations))
+            principal_cache.delete(key)
+    elif kind == "client":
+        client_cache.delete(key)
+
+
+invalidation_bus.subscribe(evict)
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Descarta dados em cache do usuário em todos os workers
+    (ex: após desativação ou revogação de sessões)
+    """
+    invalidation_bus.publish("user", user_id)
+
+
+def invalidate_client(client_id: str) -> None:
+    """
+    Descarta o cliente do cache em todos os workers
+    (ex: após desativação ou rotação do segredo)
+    """
+    invalidation_bus.publish("client", client_id)
@@ -0,0 +1,247 @@
+"""
+Barramento de invalidação de caches entre workers
+
+Cada worker mantém seus próprios caches em memória (usuários, clientes).
+Quando um worker desativa um usuário, revoga sessões ou altera um cliente,
+publica um evento no barramento e todos os workers descartam a entrada.
+
+Backends (INVALIDATION_BUS_BACKEND):
+
+- `local`: somente o próprio processo (um worker, desenvolvimento)
+- `postgres`: LISTEN/NOTIFY no banco principal, entre hosts
+- `unix`: sockets de datagrama Unix em um diretório compartilhado, entre
+  processos do mesmo host (testes com vários processos, sem PostgreSQL)
+"""
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import select
+import socket
+import threading
+from pathlib import Path
+from typing import Callable, Hashable, List
+
+from sqlalchemy import text
+
+from ..config import settings
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, Hashable], None]
+
+
+class InvalidationBus:
+    """
+    Publica eventos (tipo, chave) para todos os workers
+
+    Os handlers inscritos são chamados para os eventos publicados por este
+    e pelos demais processos. Eventos remotos chegam em uma thread do
+    barramento, então os handlers devem ser thread-safe.
+    """
+
+    def __init__(self):
+        self.origin = self._new_origin()
+        self._handlers: List[Handler] = []
+        self.published = metrics.counter("invalidation_published_total", "Eventos de invalidação publicados")
+        self.received = metrics.counter("invalidation_received_total", "Eventos de invalidação recebidos de outros workers")
+
+    @staticmethod
+    def _new_origin() -> str:
+        return f"{os.getpid()}-{secrets.token_hex(4)}"
+
+    def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+    def publish(self, kind: str, key: Hashable) -> None:
+        """Aplica o evento localmente e o envia aos demais workers"""
+        self._dispatch(kind, key)
+        self.published.inc()
+        try:
+            self._send(json.dumps({"kind": kind, "key": key, "origin": self.origin}))
+        except Exception as e:
+            # A entrada remota ainda expira pelo TTL do cache
+            logger.error(f"Erro ao publicar invalidação {kind}={key}: {e}")
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def _send(self, message: str) -> None:
+        pass
+
+    def _receive(self, message: str) -> None:
+        try:
+            event = json.loads(message)
+        except ValueError:
+            logger.warning("Mensagem de invalidação inválida descartada")
+            return
+        if event.get("origin") == self.origin:
+            return
+        self.received.inc()
+        self._dispatch(event["kind"], event["key"])
+
+    def _dispatch(self, kind: str, key: Hashable) -> None:
+        for handler in self._handlers:
+            try:
+                handler(kind, key)
+            except Exception as e:
+                logger.error(f"Erro no handler de invalidação {kind}={key}: {e}")
+
+
+def multiple_workers() -> bool:
+    """
+    Indica se a aplicação roda em vários processos de worker
+
+    Considera WEB_CONCURRENCY (lido por uvicorn e gunicorn) e, fora de DEBUG,
+    a execução em um subprocesso (`uvicorn --workers N`). Em DEBUG o
+    subprocesso é o do --reload, que tem um único worker.
+    """
+    try:
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            return True
+    except ValueError:
+        pass
+    return not settings.DEBUG and multiprocessing.parent_process() is not None
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """Somente o processo atual"""
+
+    def start(self) -> None:
+        if multiple_workers() and settings.PRINCIPAL_CACHE_TTL_SECONDS > 0:
+            logger.warning(
+                "INVALIDATION_BUS_BACKEND=local com vários workers: desativações e revogações "
+                "só chegam aos caches dos demais workers após PRINCIPAL_CACHE_TTL_SECONDS. "
+                "Use INVALIDATION_BUS_BACKEND=postgres (ou unix, em um único host)."
+            )
+
+
+class PostgresInvalidationBus(InvalidationBus):
+    """LISTEN/NOTIFY do PostgreSQL; uma conexão dedicada por worker escuta o canal"""
+
+    def __init__(self, engine, channel: str = "cache_invalidation", reconnect_seconds: float = 1.0):
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        # Identidade renovada no processo do worker (após um eventual fork)
+        self.origin = self._new_origin()
+        self._thread = threading.Thread(target=self._listen, name="invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _send(self, message: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(text("SELECT pg_notify(:channel, :message)"), {"channel": self.channel, "message": message})
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                raw = self.engine.raw_connection()
+            except Exception as e:
+                logger.error(f"Barramento de invalidação sem conexão: {e}")
+                self._stop.wait(self.reconnect_seconds)
+                continue
+            try:
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.info(f"Barramento de invalidação escutando o canal {self.channel}")
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self._receive(connection.notifies.pop(0).payload)
+            except Exception as e:
+                # Eventos emitidos durante a reconexão se perdem; o TTL dos caches limita o atraso
+                logger.error(f"Erro no barramento de invalidação, reconectando: {e}")
+                self._stop.wait(self.reconnect_seconds)
+            finally:
+                raw.invalidate()
+
+
+class UnixSocketInvalidationBus(InvalidationBus):
+    """
+    Um socket de datagrama por processo em `directory`; publicar envia o
+    evento a todos os sockets do diretório
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = Path(directory)
+        self.path = None
+        self._socket = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        # Identidade renovada no processo do worker (após um eventual fork)
+        self.origin = self._new_origin()
+        self.path = self.directory / f"{self.origin}.sock"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(str(self.path))
+        self._socket.settimeout(1.0)
+        self._thread = threading.Thread(target=self._listen, name="invalidation-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._socket is not None:
+            self._socket.close()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+    def _send(self, message: str) -> None:
+        data = message.encode()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            for peer in self.directory.glob("*.sock"):
+                if peer == self.path:
+                    continue
+                try:
+                    sender.sendto(data, str(peer))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Processo encerrado sem remover o socket
+                    peer.unlink(missing_ok=True)
+
+    def _listen(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self._stop.is_set():
+                    logger.error("Socket do barramento de invalidação fechado")
+                return
+            self._receive(data.decode())
+
+
+def create_bus(backend: str) -> InvalidationBus:
+    """Instancia o barramento configurado em INVALIDATION_BUS_BACKEND"""
+    if backend == "postgres":
+        from ..models.database import engine
+        return PostgresInvalidationBus(engine, settings.INVALIDATION_CHANNEL)
+    if backend == "unix":
+        return UnixSocketInvalidationBus(settings.INVALIDATION_SOCKET_DIR)
+    return LocalInvalidationBus()
+
+
+invalidation_bus = create_bus(settings.INVALIDATION_BUS_BACKEND)
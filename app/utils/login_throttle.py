@@ -0,0 +1,297 @@
+"""
+Bloqueio progressivo de logins por username, verificado antes do bcrypt
+
+Cada falha soma 1 a um contador com decaimento exponencial. Acima de
+LOGIN_THROTTLE_THRESHOLD, o username fica bloqueado por um tempo que dobra
+a cada nova falha (até LOGIN_THROTTLE_MAX_LOCKOUT_SECONDS). Tentativas
+durante o bloqueio são rejeitadas sem consultar o banco de usuários nem
+executar o bcrypt.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import IntegrityError
+
+from ..config import settings
+from ..metrics import metrics
+from ..models import LoginFailure
+from ..models.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class FailureState:
+    """Estado de falhas de um username"""
+
+    __slots__ = ("score", "last_failure_at", "locked_until")
+
+    def __init__(self, score: float = 0.0, last_failure_at: float = 0.0, locked_until: float = 0.0):
+        self.score = score
+        self.last_failure_at = last_failure_at
+        self.locked_until = locked_until
+
+
+def decayed_score(state: FailureState, now: float, half_life: float) -> float:
+    """Contagem de falhas em `now`: falhas antigas pesam cada vez menos"""
+    elapsed = max(0.0, now - state.last_failure_at)
+    return state.score * 0.5 ** (elapsed / half_life)
+
+
+class InMemoryFailureStore:
+    """
+    Estados de falha em memória do worker
+
+    Os estados sem bloqueio são limitados a `max_entries` (LRU). Usernames
+    bloqueados ficam à parte, limitados a `max_locked`, e saem ao fim do
+    bloqueio: do contrário, uma enxurrada de usernames aleatórios
+    empurraria o bloqueado para fora do LRU e zeraria o seu bloqueio. Com
+    o limite atingido, o bloqueio que vence primeiro passa para o LRU, onde
+    continua valendo até vencer ou ser descartado.
+    """
+
+    def __init__(self, max_entries: int = 100_000, max_locked: int = 100_000):
+        self.max_entries = max_entries
+        self.max_locked = max_locked
+        self._states: "OrderedDict[str, FailureState]" = OrderedDict()
+        self._locked: Dict[str, FailureState] = {}
+        # Heap (locked_until, username) para liberar bloqueios em ordem de vencimento;
+        # entradas de bloqueios já substituídos ou removidos são ignoradas ao sair
+        self._expirations: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[FailureState]:
+        with self._lock:
+            return self._get(username)
+
+    def set(self, username: str, state: FailureState) -> None:
+        with self._lock:
+            self._set(username, state, time.time())
+
+    def add_failure(self, username: str, now: float, half_life: float) -> FailureState:
+        """Soma uma falha ao contador (com decaimento) e retorna o novo estado"""
+        with self._lock:
+            state = self._get(username) or FailureState()
+            state = FailureState(decayed_score(state, now, half_life) + 1, now, state.locked_until)
+            self._set(username, state, now)
+            return state
+
+    def lock(self, username: str, state: FailureState) -> None:
+        """Aplica o bloqueio de `state`, sem encurtar um bloqueio mais longo já registrado"""
+        with self._lock:
+            current = self._get(username)
+            if current is not None and current.locked_until > state.locked_until:
+                return
+            self._set(username, state, time.time())
+
+    def delete(self, username: str) -> None:
+        with self._lock:
+            self._states.pop(username, None)
+            self._locked.pop(username, None)
+
+    def _get(self, username: str) -> Optional[FailureState]:
+        state = self._locked.get(username)
+        return state if state is not None else self._states.get(username)
+
+    def _set(self, username: str, state: FailureState, now: float) -> None:
+        self._release_locks(lambda locked_until: locked_until <= now)
+        if state.locked_until > now:
+            self._states.pop(username, None)
+            if username not in self._locked and len(self._locked) >= self.max_locked:
+                self._release_locks(lambda locked_until: True, limit=1)
+            self._locked[username] = state
+            heapq.heappush(self._expirations, (state.locked_until, username))
+            if len(self._expirations) > 2 * self.max_locked:
+                self._expirations = [(s.locked_until, name) for name, s in self._locked.items()]
+                heapq.heapify(self._expirations)
+            return
+        self._locked.pop(username, None)
+        self._move_to_lru(username, state)
+
+    def _release_locks(self, should_release, limit: Optional[int] = None) -> None:
+        # Bloqueios liberados voltam ao LRU, mantendo a contagem para o próximo bloqueio
+        released = 0
+        while self._expirations and should_release(self._expirations[0][0]):
+            locked_until, username = heapq.heappop(self._expirations)
+            state = self._locked.get(username)
+            if state is None or state.locked_until != locked_until:
+                continue
+            self._move_to_lru(username, self._locked.pop(username))
+            released += 1
+            if limit is not None and released >= limit:
+                return
+
+    def _move_to_lru(self, username: str, state: FailureState) -> None:
+        self._states[username] = state
+        self._states.move_to_end(username)
+        while len(self._states) > self.max_entries:
+            self._states.popitem(last=False)
+
+
+class DatabaseFailureStore:
+    """
+    Estados de falha na tabela `login_failures`, compartilhados entre workers
+
+    Cada falha é somada com um único UPDATE atômico (o decaimento é
+    calculado no banco), então falhas simultâneas em workers diferentes
+    nunca se sobrescrevem. Mantém uma cópia local dos usernames bloqueados
+    para que tentativas repetidas durante o bloqueio não consultem o banco.
+    """
+
+    def __init__(self):
+        self._local = InMemoryFailureStore(settings.LOGIN_THROTTLE_MAX_ENTRIES, settings.LOGIN_THROTTLE_MAX_LOCKED)
+
+    def get(self, username: str) -> Optional[FailureState]:
+        local = self._local.get(username)
+        if local is not None and local.locked_until > time.time():
+            return local
+
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            row = db.get(LoginFailure, username)
+            if row is None:
+                return None
+            state = FailureState(row.score, row.last_failure_at, row.locked_until)
+        finally:
+            db.close()
+
+        if state.locked_until > time.time():
+            self._local.set(username, state)
+        return state
+
+    def add_failure(self, username: str, now: float, half_life: float) -> FailureState:
+        """Soma uma falha com UPDATE atômico (ou cria a linha) e retorna o novo estado"""
+        # power() existe no PostgreSQL e no SQLite >= 3.35 (funções matemáticas)
+        elapsed = case((LoginFailure.last_failure_at < now, now - LoginFailure.last_failure_at), else_=0.0)
+        increment = (
+            update(LoginFailure)
+            .where(LoginFailure.username == username)
+            .values(score=LoginFailure.score * func.power(0.5, elapsed / half_life) + 1, last_failure_at=now)
+            .returning(LoginFailure.score, LoginFailure.locked_until)
+            .execution_options(synchronize_session=False)
+        )
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            row = db.execute(increment).first()
+            if row is None:
+                try:
+                    db.add(LoginFailure(username=username, score=1.0, last_failure_at=now, locked_until=0.0))
+                    db.commit()
+                    return FailureState(1.0, now, 0.0)
+                except IntegrityError:
+                    # Outro worker criou a linha primeiro: soma sobre ela
+                    db.rollback()
+                    row = db.execute(increment).one()
+            db.commit()
+            return FailureState(row.score, now, row.locked_until)
+        finally:
+            db.close()
+
+    def lock(self, username: str, state: FailureState) -> None:
+        """Estende o bloqueio até `state.locked_until` (nunca o encurta)"""
+        locked_until = case(
+            (LoginFailure.locked_until < state.locked_until, state.locked_until),
+            else_=LoginFailure.locked_until,
+        )
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            db.execute(
+                update(LoginFailure)
+                .where(LoginFailure.username == username)
+                .values(locked_until=locked_until)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._local.lock(username, state)
+
+    def delete(self, username: str) -> None:
+        self._local.delete(username)
+        db = SessionLocal()
+        db.use_primary()
+        try:
+            db.query(LoginFailure).filter(LoginFailure.username == username).delete()
+            db.commit()
+        finally:
+            db.close()
+
+
+class LoginThrottle:
+    """Contador de falhas com decaimento e bloqueio exponencial por username"""
+
+    def __init__(
+        self,
+        store,
+        threshold: int = 5,
+        half_life_seconds: float = 600,
+        base_lockout_seconds: float = 1,
+        max_lockout_seconds: float = 900,
+        enabled: bool = True,
+    ):
+        self.store = store
+        self.threshold = threshold
+        self.half_life = half_life_seconds
+        self.base_lockout = base_lockout_seconds
+        self.max_lockout = max_lockout_seconds
+        self.enabled = enabled
+        self.rejected = metrics.counter("login_throttle_rejected_total", "Logins rejeitados antes do bcrypt")
+        self.lockouts = metrics.counter("login_throttle_lockouts_total", "Bloqueios aplicados a usernames")
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return username.strip().lower()
+
+    def retry_after(self, username: str) -> Optional[float]:
+        """Segundos restantes de bloqueio, ou None se o login pode prosseguir"""
+        if not self.enabled:
+            return None
+        state = self.store.get(self._key(username))
+        if state is None:
+            return None
+        remaining = state.locked_until - time.time()
+        if remaining <= 0:
+            return None
+        self.rejected.inc()
+        return remaining
+
+    def record_failure(self, username: str) -> None:
+        if not self.enabled:
+            return
+        key = self._key(username)
+        now = time.time()
+        state = self.store.add_failure(key, now, self.half_life)
+        score = state.score
+
+        # Falhas em sequência rápida decaem quase nada: arredonda para não
+        # exigir uma tentativa a mais por causa de frações mínimas
+        if round(score, 1) >= self.threshold:
+            lockout = min(self.base_lockout * 2 ** max(0.0, score - self.threshold), self.max_lockout)
+            self.store.lock(key, FailureState(score, now, now + lockout))
+            self.lockouts.inc()
+            logger.warning(f"Login bloqueado por {lockout:.0f}s: username={username} (falhas={score:.1f})")
+
+    def record_success(self, username: str) -> None:
+        if not self.enabled:
+            return
+        key = self._key(username)
+        if self.store.get(key) is not None:
+            self.store.delete(key)
+
+
+login_throttle = LoginThrottle(
+    DatabaseFailureStore() if settings.LOGIN_THROTTLE_BACKEND == "database"
+    else InMemoryFailureStore(settings.LOGIN_THROTTLE_MAX_ENTRIES, settings.LOGIN_THROTTLE_MAX_LOCKED),
+    threshold=settings.LOGIN_THROTTLE_THRESHOLD,
+    half_life_seconds=settings.LOGIN_THROTTLE_HALF_LIFE_SECONDS,
+    base_lockout_seconds=settings.LOGIN_THROTTLE_BASE_LOCKOUT_SECONDS,
+    max_lockout_seconds=settings.LOGIN_THROTTLE_MAX_LOCKOUT_SECONDS,
+    enabled=settings.LOGIN_THROTTLE_ENABLED,
+)
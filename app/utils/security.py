@@ -1,32 +1,75 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
+import base64
 import bcrypt
+import hashlib
+import hmac
+import json
+import re
 import secrets
 from ..config import settings
+from ..metrics import metrics
+from ..tracing import tracer
+from .cache import invalid_token_cache
+
+# Três segmentos base64url (header.payload.assinatura)
+JWT_STRUCTURE_RE = re.compile(r"^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$")
+
+invalid_token_hits = metrics.counter("invalid_token_cache_hits_total", "Tokens inválidos rejeitados pelo cache negativo")
+precheck_rejections = metrics.counter("token_precheck_rejected_total", "Tokens rejeitados pela verificação estrutural")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha plain text corresponde ao hash"""
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'),
-        hashed_password.encode('utf-8')
-    )
+    with tracer.start_span("bcrypt.checkpw"):
+        return bcrypt.checkpw(
+            plain_password.encode('utf-8'),
+            hashed_password.encode('utf-8')
+        )
 
 
 def get_password_hash(password: str) -> str:
     """Gera hash da senha"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
+    with tracer.start_span("bcrypt.hashpw"):
+        salt = bcrypt.gensalt()
+        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
 
+def hash_client_secret(client_secret: str) -> str:
+    """
+    Gera o HMAC-SHA256 do segredo de um cliente OAuth2
+    
+    Segredos de clientes são gerados aleatoriamente com alta entropia, então
+    um hash com chave é suficiente e custa microssegundos (ao contrário do bcrypt).
+    """
+    key = (settings.CLIENT_SECRET_KEY or settings.SECRET_KEY).encode('utf-8')
+    return hmac.new(key, client_secret.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def verify_client_secret(client_secret: str, client_secret_hash: str) -> bool:
+    """Verifica o segredo do cliente em tempo constante"""
+    return hmac.compare_digest(hash_client_secret(client_secret), client_secret_hash)
+
+
+def create_client_credentials() -> tuple[str, str]:
+    """
+    Gera um par (client_id, client_secret) aleatório
+    
+    Returns:
+        Tupla com o identificador público e o segredo do cliente
+    """
+    return secrets.token_urlsafe(16), secrets.token_urlsafe(32)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Cria um token JWT de acesso com claims padrão
     
     Args:
-        data: Dados a serem codificados no token (deve conter 'sub' e 'user_id')
+        data: Dados a serem codificados no token (deve conter 'sub' e 'user_id'
+            para usuários, ou 'sub' e 'client_id' para clientes; 'scope' é opcional)
         expires_delta: Tempo de expiração customizado
     
     Returns:
@@ -49,50 +92,118 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         "aud": settings.JWT_AUDIENCE      # Audience - para quem o token foi criado
     }
     
-    encoded_jwt = jwt.encode(
-        payload,
-        settings.SECRET_KEY,
-        algorithm=settings.ALGORITHM
-    )
+    # Claims opcionais (tokens de clientes OAuth2)
+    for claim in ("client_id", "scope"):
+        if data.get(claim):
+            payload[claim] = data[claim]
+    
+    with tracer.start_span("jwt.encode", algorithm=settings.ALGORITHM):
+        encoded_jwt = jwt.encode(
+            payload,
+            settings.SECRET_KEY,
+            algorithm=settings.ALGORITHM
+        )
     
     return encoded_jwt
 
 
+def is_well_formed_token(token: str) -> bool:
+    """
+    Verificação estrutural barata, antes de qualquer operação criptográfica
+    
+    Exige tamanho limitado, três segmentos base64url e um header JSON com o
+    algoritmo configurado (rejeita `alg: none` e algoritmos trocados).
+    """
+    if len(token) > settings.ACCESS_TOKEN_MAX_LENGTH or not JWT_STRUCTURE_RE.match(token):
+        return False
+    encoded_header = token.split(".", 1)[0]
+    try:
+        header = json.loads(base64.urlsafe_b64decode(encoded_header + "=" * (-len(encoded_header) % 4)))
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("alg") == settings.ALGORITHM
+
+
 def decode_access_token(token: str) -> Optional[dict]:
     """
     Decodifica e valida um token JWT com verificação de issuer e audience
     
+    Tokens malformados são rejeitados sem criptografia; tokens que falham na
+    validação ficam por alguns segundos no cache negativo, e repetições são
+    rejeitadas sem um novo `jwt.decode`.
+    
     Args:
         token: Token JWT a ser decodificado
     
     Returns:
         Payload do token ou None se inválido
     """
-    try:
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM],
-            options={
-                "verify_aud": True,
-                "verify_iss": True
-            },
-            audience=settings.JWT_AUDIENCE,
-            issuer=settings.JWT_ISSUER
-        )
-        return payload
-    except JWTError:
+    if not is_well_formed_token(token):
+        precheck_rejections.inc()
+        return None
+    
+    digest = hashlib.sha256(token.encode()).digest()
+    if invalid_token_cache.get(digest):
+        invalid_token_hits.inc()
         return None
+    
+    with tracer.start_span("jwt.decode", algorithm=settings.ALGORITHM) as span:
+        try:
+            payload = jwt.decode(
+                token,
+                settings.SECRET_KEY,
+                algorithms=[settings.ALGORITHM],
+                options={
+                    "verify_aud": True,
+                    "verify_iss": True
+                },
+                audience=settings.JWT_AUDIENCE,
+                issuer=settings.JWT_ISSUER
+            )
+            return payload
+        except JWTError as e:
+            if span is not None:
+                span.set_attribute("jwt.error", type(e).__name__)
+            invalid_token_cache.set(digest, True)
+            return None
 
 
-def create_refresh_token() -> str:
+def create_refresh_token(expires_at: Optional[datetime] = None, shard: Optional[int] = None) -> str:
     """
     Cria um refresh token seguro e aleatório
     
+    Com REFRESH_TOKEN_PARTITIONING, o token carrega a expiração
+    (`<hex>.<epoch>`), para que a busca alcance uma única partição. Com
+    sharding, carrega também o shard do usuário (`s<shard>.<hex>`).
+    
     Returns:
-        Token aleatório de 64 caracteres hexadecimais
+        Token aleatório de 64 caracteres hexadecimais (mais prefixo/sufixo)
     """
-    return secrets.token_hex(32)
+    token = secrets.token_hex(32)
+    if shard is not None:
+        token = f"s{shard}.{token}"
+    if expires_at is not None and settings.REFRESH_TOKEN_PARTITIONING:
+        token = f"{token}.{int(expires_at.timestamp())}"
+    return token
+
+
+def refresh_token_shard_hint(token: str) -> Optional[int]:
+    """Shard embutido no refresh token, ou None para tokens sem prefixo"""
+    prefix, separator, _ = token.partition(".")
+    if not separator or not prefix.startswith("s") or not prefix[1:].isdigit():
+        return None
+    return int(prefix[1:])
+
+
+def refresh_token_expiry_hint(token: str) -> Optional[datetime]:
+    """Expiração embutida no refresh token, ou None para tokens sem sufixo"""
+    _, separator, suffix = token.rpartition(".")
+    if not separator or not suffix.isdigit():
+        return None
+    try:
+        return datetime.fromtimestamp(int(suffix), timezone.utc)
+    except (OverflowError, ValueError, OSError):
+        return None
 
 
 def get_refresh_token_expire_time() -> datetime:
@@ -100,6 +211,7 @@ def get_refresh_token_expire_time() -> datetime:
     Calcula o tempo de expiração para um refresh token
     
     Returns:
-        Datetime de expiração
+        Datetime de expiração, truncado ao segundo (igual ao sufixo do token)
     """
-    return datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    expires_at = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    return expires_at.replace(microsecond=0)
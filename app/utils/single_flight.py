@@ -0,0 +1,48 @@
+"""
+Coalescência de chamadas concorrentes idênticas (single-flight)
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from ..metrics import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Executa uma única computação por chave entre chamadas concorrentes
+
+    A primeira chamada inicia a computação em uma task própria; chamadas
+    com a mesma chave que chegam enquanto ela está em andamento aguardam o
+    mesmo resultado (ou a mesma exceção). Se quem iniciou a computação for
+    cancelado (cliente desconectou), a task continua para os demais.
+    Nada é guardado depois que a computação termina.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executions = metrics.counter(f"{name}_executions_total", "Computações executadas")
+        self.coalesced = metrics.counter(f"{name}_coalesced_total", "Chamadas que aguardaram uma computação em andamento")
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+            self.executions.inc()
+        else:
+            self.coalesced.inc()
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marca a exceção como consumida mesmo se todos os chamadores cancelaram
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._calls)
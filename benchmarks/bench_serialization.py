@@ -0,0 +1,95 @@
+"""
+Benchmark da serialização das respostas de token e de usuário
+
+Compara o caminho padrão do FastAPI (validação do response_model +
+jsonable_encoder + json stdlib) com a serialização direta via orjson.
+
+Execute: python benchmarks/bench_serialization.py
+"""
+import os
+import secrets
+import sys
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+# Modo produção: sem a validação extra de payloads feita em DEBUG
+os.environ.setdefault("DEBUG", "False")
+os.environ.setdefault("SECRET_KEY", secrets.token_urlsafe(32))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.responses import ORJSONResponse, token_response, user_response  # noqa: E402
+from app.schemas import Token, UserResponse  # noqa: E402
+
+N = 50_000
+
+user = SimpleNamespace(
+    id=42,
+    email="usuario@exemplo.com",
+    username="usuario",
+    full_name="Nome Completo",
+    is_active=True,
+    created_at=datetime.now(timezone.utc),
+)
+access_token = secrets.token_urlsafe(180)
+refresh_token = secrets.token_hex(32)
+token_dict = {
+    "access_token": access_token,
+    "refresh_token": refresh_token,
+    "token_type": "bearer",
+    "expires_in": 900,
+}
+verify_dict = {"valid": True, "user_id": 42, "username": "usuario", "email": "usuario@exemplo.com"}
+
+
+def default_user():
+    model = UserResponse.model_validate(user, from_attributes=True)
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def default_token():
+    model = Token.model_validate(token_dict)
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def default_verify():
+    return JSONResponse(jsonable_encoder(verify_dict)).body
+
+
+def direct_user():
+    return user_response(user).body
+
+
+def direct_token():
+    return token_response(access_token, refresh_token).body
+
+
+def direct_verify():
+    return ORJSONResponse(verify_dict).body
+
+
+def bench(name, fn):
+    seconds = min(timeit.repeat(fn, number=N, repeat=3))
+    per_call = seconds / N * 1e6
+    print(f"{name:<28} {per_call:8.2f} µs/chamada")
+    return per_call
+
+
+def main():
+    print(f"Serialização de respostas ({N} chamadas, melhor de 3)\n")
+    for label, default, direct in [
+        ("/auth/me", default_user, direct_user),
+        ("/auth/token", default_token, direct_token),
+        ("/auth/verify", default_verify, direct_verify),
+    ]:
+        before = bench(f"{label} (padrão)", default)
+        after = bench(f"{label} (orjson direto)", direct)
+        print(f"{'':<28} {before / after:8.1f}x mais rápido\n")
+
+
+if __name__ == "__main__":
+    main()
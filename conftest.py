@@ -0,0 +1,91 @@
+"""
+Configuração do pytest para os testes na raiz do repositório
+
+A aplicação lê a configuração (app/config.py) e cria os engines na
+importação, então o ambiente de teste é definido aqui, antes de qualquer
+import de `app` ou `main`: banco SQLite temporário, DEBUG (headers de
+contagem de comandos SQL) e barramento de invalidação `unix`, para que
+processos auxiliares (test_invalidation.py) compartilhem banco e eventos.
+
+Execute: pytest
+"""
+import os
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="oauth-tests-")
+PASSWORD = "secret123"
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{DATA_DIR}/oauth.sqlite",
+    "DATABASE_REPLICA_URLS": "",
+    "SHARD_DATABASE_URLS": "",
+    "DEBUG": "True",
+    "QUERY_STATS_ENABLED": "True",
+    "INVALIDATION_BUS_BACKEND": "unix",
+    "INVALIDATION_SOCKET_DIR": f"{DATA_DIR}/bus",
+    # TTL longo: só a invalidação explica um usuário sair do cache de outro processo
+    "PRINCIPAL_CACHE_TTL_SECONDS": "600",
+})
+os.environ.setdefault("SECRET_KEY", "pytest-secret-key-with-at-least-32-characters")
+
+pytest_plugins = ("app.testing",)
+
+# Scripts que exigem o servidor rodando em localhost:8001 (python test_oauth.py)
+collect_ignore = ["test_auth.py", "test_oauth.py"]
+
+
+@pytest.fixture(scope="session")
+def data_dir() -> str:
+    """Diretório temporário com o banco SQLite e os sockets do barramento"""
+    return DATA_DIR
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient da aplicação; o contexto executa o startup e o shutdown"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def create_user(client):
+    """Registra um usuário (opcionalmente administrador) e retorna o JSON do registro"""
+    from app.models import User
+    from app.models.database import SessionLocal
+
+    def create(username: str, password: str = PASSWORD, superuser: bool = False) -> dict:
+        resp = client.post("/auth/register", json={
+            "email": f"{username}@example.com", "username": username, "password": password
+        })
+        assert resp.status_code == 201, resp.text
+        if superuser:
+            with SessionLocal() as db:
+                db.query(User).filter(User.username == username).update({"is_superuser": True})
+                db.commit()
+        return resp.json()
+
+    return create
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """Faz login e retorna os tokens emitidos"""
+
+    def do_login(username: str, password: str = PASSWORD) -> dict:
+        resp = client.post("/auth/login", json={"username": username, "password": password})
+        assert resp.status_code == 200, resp.text
+        return resp.json()
+
+    return do_login
+
+
+@pytest.fixture(scope="session")
+def admin_headers(create_user, login) -> dict:
+    """Header Authorization de um administrador"""
+    create_user("pytest_admin", superuser=True)
+    return {"Authorization": f"Bearer {login('pytest_admin')['access_token']}"}
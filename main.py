@@ -5,9 +5,23 @@ import logging
 
 from app.config import settings
 from app.models import Base, engine
-from app.routers import auth_router
+from app.models.partitions import ensure_partitions
+from app.models.sharding import SHARDING_ENABLED, create_sharded_tables, shard_engines
+from app.routers import auth_router, admin_router
 from app.logging_config import setup_logging
-from app.middleware import RequestLoggingMiddleware, RateLimitMiddleware
+from app.middleware import (
+    RequestLoggingMiddleware,
+    RateLimitMiddleware,
+    AdmissionControlMiddleware,
+    parse_rate_limit_policies,
+    parse_trusted_proxies,
+)
+from app.responses import ORJSONResponse
+from app.utils.invalidation import invalidation_bus
+from app.idempotency import IdempotencyMiddleware, create_store
+from app.profiling import ProfilingMiddleware, parse_sample_routes
+from app.tracing import TracingMiddleware, instrument_sqlalchemy
+from app.query_stats import QueryCountMiddleware, instrument_query_counting
 
 # Configurar logging
 setup_logging(debug=settings.DEBUG)
@@ -18,12 +32,24 @@ logger.info(f"Modo DEBUG: {settings.DEBUG}")
 
 # Criar as tabelas do banco de dados
 try:
-    Base.metadata.create_all(bind=engine)
+    if SHARDING_ENABLED:
+        create_sharded_tables()
+        logger.info(f"Sharding habilitado: users e refresh_tokens em {len(shard_engines)} shards")
+    else:
+        Base.metadata.create_all(bind=engine)
     logger.info("Tabelas do banco de dados criadas/verificadas com sucesso")
 except Exception as e:
     logger.error(f"Erro ao criar tabelas do banco de dados: {e}")
     raise
 
+# Partições de refresh_tokens para os tokens emitidos a partir de agora
+if settings.REFRESH_TOKEN_PARTITIONING:
+    for refresh_token_engine in shard_engines or [engine]:
+        if refresh_token_engine.dialect.name != "postgresql":
+            raise ValueError("REFRESH_TOKEN_PARTITIONING requer PostgreSQL")
+        ensure_partitions(refresh_token_engine)
+    logger.info(f"refresh_tokens particionada por expires_at ({settings.REFRESH_TOKEN_PARTITIONING})")
+
 # Criar aplicação FastAPI
 app = FastAPI(
     title=settings.APP_NAME,
@@ -31,6 +57,7 @@ app = FastAPI(
     description="Servidor OAuth2 para autenticação e autorização",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
 )
 
 # Configurar CORS
@@ -49,6 +76,21 @@ else:
     allowed_origins = [origin.strip() for origin in settings.ALLOWED_ORIGINS.split(",")]
     logger.info(f"CORS configurado com origens específicas: {allowed_origins}")
 
+# Idempotency-Key: repetições reenviam a resposta original (dentro do
+# controle de admissão, para que respostas 503 não sejam armazenadas)
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        store=create_store(
+            settings.IDEMPOTENCY_BACKEND,
+            settings.IDEMPOTENCY_TTL_SECONDS,
+            settings.IDEMPOTENCY_MAX_ENTRIES,
+        ),
+        paths=[path.strip() for path in settings.IDEMPOTENCY_PATHS.split(",") if path.strip()],
+    )
+
+# CORS por fora do Idempotency-Key: respostas reenviadas recebem os headers
+# da origem da repetição, não os da requisição original
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -58,19 +100,69 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Controle de admissão: descarta excesso de carga com 503 + Retry-After
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        expensive_paths=[path.strip() for path in settings.ADMISSION_EXPENSIVE_PATHS.split(",") if path.strip()],
+        expensive_max_concurrent=settings.ADMISSION_EXPENSIVE_MAX_CONCURRENT,
+        expensive_max_queue=settings.ADMISSION_EXPENSIVE_MAX_QUEUE,
+        cheap_max_concurrent=settings.ADMISSION_CHEAP_MAX_CONCURRENT,
+        cheap_max_queue=settings.ADMISSION_CHEAP_MAX_QUEUE,
+        queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+        retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    )
+    logger.info(
+        f"Controle de admissão habilitado: {settings.ADMISSION_EXPENSIVE_MAX_CONCURRENT} "
+        f"requisições caras simultâneas"
+    )
+
 # Adicionar middleware de logging de requisições
 app.add_middleware(RequestLoggingMiddleware)
 
+# Comandos SQL e tempo de banco por requisição (headers apenas em DEBUG)
+if settings.QUERY_STATS_ENABLED:
+    instrument_query_counting()
+    app.add_middleware(
+        QueryCountMiddleware,
+        expose_headers=settings.DEBUG,
+        n_plus_one_threshold=settings.N_PLUS_ONE_THRESHOLD,
+    )
+
+# Tracing de requisições, bcrypt, JWT e SQL (opt-in)
+if settings.TRACING_ENABLED:
+    instrument_sqlalchemy()
+    app.add_middleware(TracingMiddleware)
+    logger.info(f"Tracing habilitado: exporter={settings.TRACING_EXPORTER}")
+
+# Profiling sob demanda (opt-in)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=settings.PROFILING_TOKEN,
+        sample_routes=parse_sample_routes(settings.PROFILING_SAMPLE_ROUTES),
+        output_dir=settings.PROFILING_OUTPUT_DIR,
+        interval_ms=settings.PROFILING_INTERVAL_MS,
+        max_files=settings.PROFILING_MAX_FILES,
+    )
+    logger.info(f"Profiling habilitado: perfis em {settings.PROFILING_OUTPUT_DIR}/")
+
 # Adicionar rate limiting (apenas em produção)
 if not settings.DEBUG:
+    rate_limit_policies = parse_rate_limit_policies(
+        settings.RATE_LIMIT_POLICIES, settings.RATE_LIMIT_PER_MINUTE
+    )
     app.add_middleware(
         RateLimitMiddleware,
-        requests_per_minute=settings.RATE_LIMIT_PER_MINUTE
+        requests_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+        policies=rate_limit_policies,
+        trusted_proxies=parse_trusted_proxies(settings.TRUSTED_PROXIES),
     )
-    logger.info(f"Rate limiting habilitado: {settings.RATE_LIMIT_PER_MINUTE} req/min")
+    logger.info(f"Rate limiting habilitado: políticas {[policy.name for policy in rate_limit_policies]}")
 
 # Incluir rotas
 app.include_router(auth_router)
+app.include_router(admin_router)
 logger.info("Rotas de autenticação registradas")
 
 
@@ -114,12 +206,14 @@ async def startup_event():
     logger.info(f"Servidor {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info(f"Documentação disponível em /docs")
     logger.info("========================================")
+    invalidation_bus.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento executado ao desligar o servidor"""
     logger.info("Servidor OAuth2 sendo desligado...")
+    invalidation_bus.stop()
 
 
 def main():
@@ -0,0 +1,125 @@
+"""
+Grant authorization_code com PKCE (S256): verificação do code_verifier,
+uso único do código e autenticação de clientes confidenciais e públicos
+Execute: pytest test_authorization_code.py
+"""
+
+import secrets
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+PASSWORD = "secret123"
+REDIRECT_URI = "https://app.example.com/callback"
+
+
+@pytest.fixture(scope="module")
+def pkce_user(create_user):
+    return create_user("pkce_carol")
+
+
+def register_client(client, admin_headers, name, is_public=False) -> dict:
+    resp = client.post(
+        "/auth/admin/clients",
+        json={"name": name, "scopes": "read write", "redirect_uris": REDIRECT_URI, "is_public": is_public},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 201, resp.text
+    return resp.json()
+
+
+@pytest.fixture(scope="module")
+def confidential_client(client, admin_headers):
+    return register_client(client, admin_headers, "pkce-confidential")
+
+
+@pytest.fixture(scope="module")
+def public_client(client, admin_headers):
+    return register_client(client, admin_headers, "pkce-public", is_public=True)
+
+
+def authorize(client, oauth_client, verifier, method="S256", scope="read"):
+    """Autoriza como pkce_carol e retorna a query do redirecionamento ao cliente"""
+    from app.utils.auth_codes import pkce_challenge
+
+    resp = client.post("/auth/authorize", data={
+        "username": "pkce_carol",
+        "password": PASSWORD,
+        "response_type": "code",
+        "client_id": oauth_client["client_id"],
+        "redirect_uri": REDIRECT_URI,
+        "code_challenge": pkce_challenge(verifier) if method == "S256" else verifier,
+        "code_challenge_method": method,
+        "scope": scope,
+        "state": "xyz",
+    }, follow_redirects=False)
+    assert resp.status_code == 303, resp.text
+    location = urlsplit(resp.headers["location"])
+    assert f"{location.scheme}://{location.netloc}{location.path}" == REDIRECT_URI
+    return {name: values[0] for name, values in parse_qs(location.query).items()}
+
+
+def exchange(client, oauth_client, code, verifier, with_secret=True):
+    data = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": REDIRECT_URI,
+        "code_verifier": verifier,
+        "client_id": oauth_client["client_id"],
+    }
+    if with_secret:
+        data["client_secret"] = oauth_client["client_secret"]
+    return client.post("/auth/token", data=data)
+
+
+def test_code_exchanged_with_matching_verifier(client, pkce_user, confidential_client):
+    verifier = secrets.token_urlsafe(48)
+    redirect = authorize(client, confidential_client, verifier)
+    assert redirect["state"] == "xyz"
+
+    resp = exchange(client, confidential_client, redirect["code"], verifier)
+    assert resp.status_code == 200, resp.text
+    tokens = resp.json()
+    assert tokens["scope"] == "read"
+    resp = client.get("/auth/me", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert resp.status_code == 200 and resp.json()["id"] == pkce_user["id"]
+
+    # Código de uso único
+    resp = exchange(client, confidential_client, redirect["code"], verifier)
+    assert resp.status_code == 400
+
+
+def test_wrong_verifier_rejected_and_code_consumed(client, pkce_user, confidential_client):
+    verifier = secrets.token_urlsafe(48)
+    redirect = authorize(client, confidential_client, verifier)
+
+    resp = exchange(client, confidential_client, redirect["code"], secrets.token_urlsafe(48))
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid authorization code"
+    # A tentativa inválida invalida o código, mesmo com o verifier certo depois
+    resp = exchange(client, confidential_client, redirect["code"], verifier)
+    assert resp.status_code == 400
+
+
+def test_plain_challenge_method_rejected(client, pkce_user, confidential_client):
+    redirect = authorize(client, confidential_client, secrets.token_urlsafe(48), method="plain")
+    assert "code" not in redirect
+    assert redirect["error"] == "invalid_request"
+
+
+def test_public_client_needs_only_the_verifier(client, pkce_user, public_client):
+    verifier = secrets.token_urlsafe(48)
+    redirect = authorize(client, public_client, verifier)
+    resp = exchange(client, public_client, redirect["code"], secrets.token_urlsafe(48), with_secret=False)
+    assert resp.status_code == 400
+
+    redirect = authorize(client, public_client, verifier)
+    resp = exchange(client, public_client, redirect["code"], verifier, with_secret=False)
+    assert resp.status_code == 200, resp.text
+
+
+def test_confidential_client_needs_its_secret(client, pkce_user, confidential_client):
+    verifier = secrets.token_urlsafe(48)
+    redirect = authorize(client, confidential_client, verifier)
+    resp = exchange(client, confidential_client, redirect["code"], verifier, with_secret=False)
+    assert resp.status_code == 401
@@ -0,0 +1,55 @@
+"""
+Importação em massa de usuários (app/cli/import_users.py): linhas válidas
+gravadas e inválidas no arquivo de rejeitados, sem derrubar o lote
+Execute: pytest test_import_users.py
+"""
+
+import json
+
+PASSWORD = "secret123"
+
+
+def read_rejects(path) -> dict:
+    return {row["line"]: row for row in map(json.loads, path.read_text().splitlines())}
+
+
+def test_invalid_rows_go_to_rejects_file(tmp_path, create_user):
+    from app.cli.import_users import main
+    from app.models import User
+    from app.models.database import SessionLocal
+
+    create_user("import_existing")
+    rows = [
+        {"email": "import_ok1@example.com", "username": "import_ok1", "password": PASSWORD},
+        {"email": "import_long@example.com", "username": "import_long", "password": "x" * 80},
+        "{not json",
+        {"email": "not-an-email", "username": "import_bad_email", "password": PASSWORD},
+        {"email": "import_existing@example.com", "username": "import_existing", "password": PASSWORD},
+        {"email": "import_ok2@example.com", "username": "import_ok2", "password": "é" * 30},
+    ]
+    source = tmp_path / "users.jsonl"
+    source.write_text("\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n")
+    rejects_path = tmp_path / "rejects.jsonl"
+
+    assert main([str(source), "--workers", "1", "--progress-every", "0", "--rejects", str(rejects_path)]) == 0
+
+    with SessionLocal() as db:
+        imported = {username for (username,) in db.query(User.username).filter(User.username.like("import_%"))}
+    assert imported == {"import_existing", "import_ok1", "import_ok2"}
+
+    rejects = read_rejects(rejects_path)
+    assert set(rejects) == {2, 3, 4, 5}
+    assert "72 bytes" in rejects[2]["reason"]
+    assert rejects[3]["reason"] == "invalid: malformed line"
+    assert rejects[4]["reason"].startswith("invalid: email")
+    assert rejects[5]["reason"].startswith("conflict")
+    # O arquivo de rejeitados nunca contém senhas
+    assert all("password" not in reject["row"] for reject in rejects.values())
+
+
+def test_hash_failure_rejects_only_its_row():
+    from app.cli.import_users import hash_passwords
+
+    [(hashed, error), (failed, reason)] = hash_passwords([PASSWORD, "x" * 80])
+    assert hashed.startswith("$2b$") and error is None
+    assert failed is None and "72 bytes" in reason
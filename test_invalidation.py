@@ -0,0 +1,100 @@
+"""
+Invalidação de caches entre processos
+Um segundo worker (processo separado) compartilha o banco SQLite e o
+barramento `unix` configurados em conftest.py; a desativação de um usuário
+em um worker precisa descartar o usuário do cache do outro, bem antes do TTL.
+O barramento `postgres` é testado com TEST_POSTGRES_URL (psycopg2).
+Execute: pytest test_invalidation.py
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+
+def worker(connection, access_token):
+    """Segundo worker: guarda o usuário em cache e observa a invalidação"""
+    from fastapi.testclient import TestClient
+    import main as server
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    # O contexto executa o startup (inicia o barramento deste processo)
+    with TestClient(server.app) as client:
+        connection.send(client.get("/auth/me", headers=headers).status_code)
+        connection.recv()  # usuário desativado pelo outro worker
+        deadline = time.monotonic() + 5
+        status_code = client.get("/auth/me", headers=headers).status_code
+        while status_code == 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            status_code = client.get("/auth/me", headers=headers).status_code
+        connection.send(status_code)
+
+
+@pytest.fixture
+def second_worker():
+    """Inicia `worker` em outro processo (spawn: importa a aplicação do zero)"""
+    processes = []
+
+    def start(access_token):
+        parent_end, child_end = multiprocessing.Pipe()
+        process = multiprocessing.get_context("spawn").Process(target=worker, args=(child_end, access_token))
+        process.start()
+        processes.append(process)
+        return parent_end
+
+    yield start
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+
+
+def test_deactivation_evicts_user_in_other_worker(client, create_user, login, admin_headers, second_worker):
+    alice = create_user("invalidation_alice")
+    tokens = login("invalidation_alice")
+
+    connection = second_worker(tokens["access_token"])
+    assert connection.poll(30), "segundo worker não iniciou"
+    assert connection.recv() == 200, "segundo worker não guardou o usuário em cache"
+
+    resp = client.post(f"/auth/admin/users/{alice['id']}/deactivate", headers=admin_headers)
+    assert resp.status_code == 200, resp.text
+    connection.send("deactivated")
+
+    assert connection.poll(10), "segundo worker não respondeu após a desativação"
+    assert connection.recv() == 400, "segundo worker ainda aceita o usuário desativado"
+
+
+def test_postgres_bus_delivers_to_other_listener():
+    pytest.importorskip("psycopg2")
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL não configurada (ex: postgresql+psycopg2://oauth@localhost/oauth)")
+    from sqlalchemy import create_engine
+    from app.utils.invalidation import PostgresInvalidationBus
+
+    engine = create_engine(url)
+    channel = f"cache_invalidation_test_{os.getpid()}"
+    publisher, listener = PostgresInvalidationBus(engine, channel), PostgresInvalidationBus(engine, channel)
+    received = []
+    delivered = threading.Event()
+
+    def handler(kind, key):
+        received.append((kind, key))
+        delivered.set()
+
+    listener.subscribe(handler)
+    listener.start()
+    try:
+        # O LISTEN é executado na thread do barramento; republica até a entrega
+        deadline = time.monotonic() + 10
+        while not delivered.is_set() and time.monotonic() < deadline:
+            publisher.publish("user", 42)
+            delivered.wait(0.5)
+    finally:
+        listener.stop()
+        engine.dispose()
+    assert ("user", 42) in received
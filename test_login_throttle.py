@@ -0,0 +1,52 @@
+"""
+Bloqueio progressivo de logins por username (app/utils/login_throttle.py)
+Execute: pytest test_login_throttle.py
+"""
+
+import time
+
+PASSWORD = "secret123"
+
+
+def fail_until_locked(client, username):
+    from app.config import settings
+
+    for _ in range(settings.LOGIN_THROTTLE_THRESHOLD):
+        resp = client.post("/auth/login", json={"username": username, "password": "wrong-password"})
+        assert resp.status_code == 401
+
+
+def test_lockout_rejects_correct_password_until_it_expires(client, create_user, login):
+    create_user("throttle_bob")
+    fail_until_locked(client, "throttle_bob")
+
+    resp = client.post("/auth/login", json={"username": "throttle_bob", "password": PASSWORD})
+    assert resp.status_code == 429
+    retry_after = int(resp.headers["Retry-After"])
+    assert retry_after >= 1
+    # O bloqueio vale para o username, em qualquer grafia e endpoint de login
+    resp = client.post("/auth/token", data={"username": "Throttle_Bob", "password": PASSWORD})
+    assert resp.status_code == 429
+
+    time.sleep(retry_after + 0.1)
+    assert login("throttle_bob")["access_token"]
+
+
+def test_unknown_username_is_locked_like_existing_ones(client):
+    fail_until_locked(client, "throttle_nobody")
+    resp = client.post("/auth/login", json={"username": "throttle_nobody", "password": PASSWORD})
+    assert resp.status_code == 429
+
+
+def test_locked_usernames_are_capped():
+    from app.utils.login_throttle import FailureState, InMemoryFailureStore
+
+    store = InMemoryFailureStore(max_entries=10, max_locked=3)
+    now = time.time()
+    for index in range(100):
+        store.lock(f"user{index}", FailureState(5.0, now, now + 60 + index))
+    assert len(store._locked) == 3
+    # Os bloqueios que vencem por último ficam à parte; os demais passam ao LRU (limitado)
+    assert {f"user{index}" for index in (97, 98, 99)} == set(store._locked)
+    assert len(store._states) == 10
+    assert store.get("user96").locked_until == now + 60 + 96
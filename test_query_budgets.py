@@ -0,0 +1,83 @@
+"""
+Orçamento de comandos SQL de cada endpoint (QUERY_BUDGETS em app/testing.py),
+medido com o cache de usuários e de clientes vazio
+Execute: pytest test_query_budgets.py
+"""
+
+import secrets
+
+import pytest
+
+PASSWORD = "secret123"
+REDIRECT_URI = "https://app.example.com/callback"
+
+
+@pytest.fixture
+def cold(client):
+    """Executa a requisição com os caches vazios (pior caso de um worker recém-iniciado)"""
+    from app.utils.cache import client_cache, principal_cache
+
+    def request(method: str, url: str, **kwargs):
+        principal_cache.clear()
+        client_cache.clear()
+        return client.request(method, url, **kwargs)
+
+    return request
+
+
+def test_query_budgets(client, cold, query_budget, admin_headers):
+    from app.utils.auth_codes import pkce_challenge
+
+    checked = set()
+
+    def check(response, route, expected_status=200):
+        assert response.status_code == expected_status, f"{route}: {response.text}"
+        count = query_budget.check(response, route)
+        print(f"[OK] {route}: {count} comando(s) SQL (orçamento: {query_budget.budgets[route]})")
+        checked.add(route)
+
+    resp = cold("POST", "/auth/register", json={
+        "email": "budget@example.com", "username": "budget", "password": PASSWORD
+    })
+    check(resp, "POST /auth/register", 201)
+    oauth_client = client.post(
+        "/auth/admin/clients",
+        json={"name": "budget", "scopes": "read", "redirect_uris": REDIRECT_URI},
+        headers=admin_headers,
+    ).json()
+
+    resp = cold("POST", "/auth/login", json={"username": "budget", "password": PASSWORD})
+    check(resp, "POST /auth/login")
+    tokens = resp.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    check(cold("POST", "/auth/token", data={"username": "budget", "password": PASSWORD}), "POST /auth/token")
+
+    verifier = secrets.token_urlsafe(48)
+    params = {
+        "response_type": "code",
+        "client_id": oauth_client["client_id"],
+        "redirect_uri": REDIRECT_URI,
+        "code_challenge": pkce_challenge(verifier),
+        "code_challenge_method": "S256",
+    }
+    check(cold("GET", "/auth/authorize", params=params), "GET /auth/authorize")
+    resp = cold(
+        "POST", "/auth/authorize",
+        data={**params, "username": "budget", "password": PASSWORD}, follow_redirects=False,
+    )
+    check(resp, "POST /auth/authorize", 303)
+
+    check(cold("POST", "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}), "POST /auth/refresh")
+
+    check(cold("GET", "/auth/me", headers=headers), "GET /auth/me")
+    check(cold("GET", "/auth/verify", headers=headers), "GET /auth/verify")
+    resp = cold(
+        "POST", "/auth/introspect", data={"token": tokens["access_token"]},
+        auth=(oauth_client["client_id"], oauth_client["client_secret"]),
+    )
+    check(resp, "POST /auth/introspect")
+    check(cold("GET", "/auth/sessions", headers=headers), "GET /auth/sessions")
+    check(cold("DELETE", "/auth/sessions", headers=headers), "DELETE /auth/sessions")
+
+    assert set(query_budget.budgets) - checked == set(), "orçamentos sem verificação neste teste"
@@ -0,0 +1,174 @@
+"""
+Sharding de usuários e refresh tokens com SQLite
+Cada shard é um arquivo SQLite local; o banco global guarda clientes,
+diretório de usuários e demais tabelas. O sharding é definido na
+importação da aplicação, então o servidor sharded roda em um processo
+próprio (uvicorn), com SHARD_DATABASE_URLS apontando para os arquivos.
+Execute: pytest test_sharding.py (TEST_SHARDS=4 muda a quantidade de shards)
+"""
+
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+PASSWORD = "secret123"
+NUM_SHARDS = int(os.getenv("TEST_SHARDS", "3"))
+NUM_USERS = 12
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def shards_dir(tmp_path_factory) -> Path:
+    return tmp_path_factory.mktemp("shards")
+
+
+@pytest.fixture(scope="module")
+def sharded_client(shards_dir):
+    """Servidor com NUM_SHARDS shards SQLite e um cliente HTTP apontando para ele"""
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{shards_dir}/global.sqlite",
+        "SHARD_DATABASE_URLS": ",".join(
+            f"sqlite:///{shards_dir}/shard{shard}.sqlite" for shard in range(NUM_SHARDS)
+        ),
+        "INVALIDATION_BUS_BACKEND": "local",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=Path(__file__).parent,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                assert server.poll() is None, "servidor sharded encerrou na inicialização"
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    assert time.monotonic() < deadline, "servidor sharded não respondeu"
+                    time.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def user_shards(shards_dir, user_id) -> list:
+    """Shards cujo arquivo contém o usuário"""
+    found = []
+    for shard in range(NUM_SHARDS):
+        with sqlite3.connect(shards_dir / f"shard{shard}.sqlite") as connection:
+            if connection.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone():
+                found.append(shard)
+    return found
+
+
+@pytest.fixture(scope="module")
+def users(sharded_client):
+    """Usuários registrados no servidor sharded (distribuídos pelo hash do id)"""
+    registered = []
+    for index in range(NUM_USERS):
+        username = f"user{index}"
+        resp = sharded_client.post("/auth/register", json={
+            "email": f"{username}@example.com", "username": username, "password": PASSWORD
+        })
+        assert resp.status_code == 201, resp.text
+        registered.append(resp.json())
+    return registered
+
+
+def test_users_distributed_across_shards(shards_dir, users):
+    placements = {user["id"]: user_shards(shards_dir, user["id"]) for user in users}
+    assert all(len(shards) == 1 for shards in placements.values()), placements
+    if NUM_SHARDS > 1:
+        assert len({shards[0] for shards in placements.values()}) > 1, f"todos no mesmo shard: {placements}"
+
+
+def test_username_and_email_unique_across_shards(sharded_client, users):
+    resp = sharded_client.post("/auth/register", json={
+        "email": "other@example.com", "username": "user3", "password": PASSWORD
+    })
+    assert resp.status_code == 400
+    resp = sharded_client.post("/auth/register", json={
+        "email": "user5@example.com", "username": "other", "password": PASSWORD
+    })
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("index", range(6))
+def test_login_refresh_and_sessions(sharded_client, shards_dir, users, index):
+    user = users[index]
+    resp = sharded_client.post("/auth/login", json={"username": user["username"], "password": PASSWORD})
+    assert resp.status_code == 200, resp.text
+    tokens = resp.json()
+    [shard] = user_shards(shards_dir, user["id"])
+    assert tokens["refresh_token"].startswith(f"s{shard}.")
+
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    resp = sharded_client.get("/auth/me", headers=headers)
+    assert resp.status_code == 200 and resp.json()["id"] == user["id"]
+
+    resp = sharded_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert resp.status_code == 200, resp.text
+    resp = sharded_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert resp.status_code == 401, "refresh token antigo não foi revogado"
+
+    resp = sharded_client.get("/auth/sessions", headers=headers)
+    assert resp.status_code == 200 and len(resp.json()["items"]) == 1
+    resp = sharded_client.delete("/auth/sessions", headers=headers)
+    assert resp.status_code == 200 and resp.json()["revoked"] == 1
+
+
+def test_login_failures(sharded_client, users):
+    resp = sharded_client.post("/auth/login", json={"username": "user1", "password": "wrong-password"})
+    assert resp.status_code == 401
+    resp = sharded_client.post("/auth/login", json={"username": "nobody", "password": PASSWORD})
+    assert resp.status_code == 401
+
+
+@pytest.fixture(scope="module")
+def sharded_admin_headers(sharded_client, shards_dir, users) -> dict:
+    admin = users[-1]
+    [shard] = user_shards(shards_dir, admin["id"])
+    with sqlite3.connect(shards_dir / f"shard{shard}.sqlite") as connection:
+        connection.execute("UPDATE users SET is_superuser = 1 WHERE id = ?", (admin["id"],))
+    resp = sharded_client.post("/auth/login", json={"username": admin["username"], "password": PASSWORD})
+    assert resp.status_code == 200, resp.text
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+def test_admin_listing_in_id_order(sharded_client, sharded_admin_headers, users):
+    """Paginação keyset intercalando os shards, sem repetir nem pular usuários"""
+    listed, params = [], {"limit": 5}
+    for _ in range(len(users)):
+        resp = sharded_client.get("/auth/admin/users", params=params, headers=sharded_admin_headers)
+        assert resp.status_code == 200, resp.text
+        page = resp.json()
+        listed.extend(item["id"] for item in page["items"])
+        if page["next_after_id"] is None:
+            break
+        params["after_id"] = page["next_after_id"]
+    assert listed == sorted(user["id"] for user in users)
+
+
+def test_admin_export_in_id_order(sharded_client, sharded_admin_headers, users):
+    resp = sharded_client.get("/auth/admin/users/export", headers=sharded_admin_headers)
+    assert resp.status_code == 200
+    exported = [int(line.split(b'"id":')[1].split(b",")[0]) for line in resp.content.splitlines()]
+    assert exported == sorted(user["id"] for user in users)